@@ -3,10 +3,32 @@ import webbrowser
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 import os
-import time
+import re
+import threading
+from rate_limiter import RateLimiter, parse_retry_after
+from crawl_journal import CrawlJournal
+import argparse
+
+# Status codes meaning "slow down" rather than "not found"
+THROTTLED_STATUS = (429, 503)
+# Status codes meaning the PDF will not appear by asking again
+MISSING_STATUS = (404, 410)
+
+# Links to the DOI resolver on the listing pages
+DOI_URL_PATTERN = re.compile(r"^https?://(dx\.)?doi\.org/")
+
+# Results of download_pdf_from_link
+PDF_DONE = "done"
+PDF_MISSING = "missing"
+PDF_FAILED = "failed"
+
+class ScrapeStopped(Exception):
+    # Raised by fetch when the stop_event is set while waiting for the rate limiter
+    pass
 
 class MDPIArticleScraper:
-    def __init__(self, base_url, year_from, year_to, page_count, file_path, page):
+    def __init__(self, base_url, year_from, year_to, page_count, file_path, page, rate_limiter=None, journal_path=None,
+                 checkpoint_path=r"F:\MDPI_run\checkpoint.txt", doi_index=None):
         self.base_url = base_url
         self.year_from = year_from
         self.year_to = year_to
@@ -14,12 +36,66 @@ class MDPIArticleScraper:
         self.file_path = file_path
         self.page = page
         self.scan_urls_output = ""
+        # One limiter is shared by listing, article and PDF requests
+        self.rate_limiter = rate_limiter or RateLimiter()
+        # The crawl journal is opened on the first scan, the output folder may not exist yet
+        self.journal_path = journal_path or os.path.join(file_path, "crawl_journal.db")
+        self._journal = None
+        self.checkpoint_path = checkpoint_path
+        # The shared DoiIndex (doi_index.py) is optional, without it no cross-source check is done
+        self.doi_index = doi_index
+        # Optional ScrapeProgress receiving structured events, and a flag to stop a running scan
+        self.progress = None
+        self.stop_event = threading.Event()
+
+
+    def report(self, kind, **data):
+        if self.progress is not None:
+            self.progress.record(kind, **data)
+
+
+    @property
+    def journal(self):
+        if self._journal is None:
+            self._journal = CrawlJournal(self.journal_path)
+        return self._journal
+
+
+    def query_key(self):
+        # Identifies the paginated search, page numbers are only comparable within the same query
+        return f"{self.base_url}|{self.year_from}|{self.year_to}|{self.page_count}"
+
 
+    def listing_url(self, page):
+        return f"{self.base_url}&page_no={page}&page_count={self.page_count}&year_from={self.year_from}&year_to={self.year_to}&view=default"
 
-    def extract_links_from_class(self, website_url):
+
+    def fetch(self, url):
+        # Throttled requests are retried until the backoff of the host reached its maximum,
+        # only then the throttled response is returned to the caller
+        while True:
+            if not self.rate_limiter.acquire(url, self.stop_event):
+                raise ScrapeStopped(url)
+            response = requests.get(url)
+
+            if response.status_code not in THROTTLED_STATUS:
+                self.rate_limiter.success(url)
+                return response
+
+            exhausted = self.rate_limiter.backoff_exhausted(url)
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            delay = self.rate_limiter.throttle(url, retry_after)
+            print(f"Error: Too many requests (status code {response.status_code}). Host cooling down for {delay:.0f} s...")
+            self.report("throttled", url=url, delay=delay)
+            if exhausted:
+                return response
+
+
+    def extract_links_from_class(self, website_url, response=None):
         links_list = []
-        # Send a GET request to the website
-        response = requests.get(website_url)
+        # Send a GET request to the website (unless the page was already fetched by the caller)
+        if response is None:
+            response = self.fetch(website_url)
 
         # Check if the request was successful
         if response.status_code == 200:
@@ -42,14 +118,66 @@ class MDPIArticleScraper:
         return links_list
 
 
+    def extract_listing_dois(self, response):
+        # Map the article links of a listing page to the DOIs shown next to them
+        listing_dois = {}
+        soup = BeautifulSoup(response.content, 'html.parser')
+        for title_link in soup.find_all('a', class_='title-link'):
+            href = title_link.get('href')
+            item = title_link.find_parent('div', class_='article-content')
+            if not href or item is None:
+                continue
+            doi_link = item.find('a', href=DOI_URL_PATTERN)
+            if doi_link:
+                # Stored like the citation_doi of the article page, without the resolver prefix
+                listing_dois['https://www.mdpi.com/' + href] = DOI_URL_PATTERN.sub("", doi_link.get('href'))
+        return listing_dois
+
+
+    def indexed_urls(self, links, response=None):
+        """
+        Returns: a dictionary link -> DOI of the article links whose DOI is already downloaded according to the
+        shared DOI index. The DOIs come from the listing page and from the crawl journal, so no article page is requested.
+        """
+        if self.doi_index is None:
+            return {}
+        link_dois = self.journal.dois_for_urls(links)
+        if response is not None:
+            link_dois.update(self.extract_listing_dois(response))
+        return {link: link_dois[link] for link in self.doi_index.done_keys(link_dois)}
+
+
+    def estimate_page_count(self):
+        # Read the number of result pages of the query from the first listing page (None if it can't be found)
+        link = self.listing_url(1)
+        response = self.fetch(link)
+        if response.status_code != 200:
+            print(f"Error: Could not retrieve the website. Response status code: {response.status_code}")
+            return None
+
+        text = BeautifulSoup(response.content, 'html.parser').get_text(" ", strip=True)
+        pages_match = re.search(r"page\s+\d+\s+of\s+([\d,]+)", text, re.IGNORECASE)
+        if pages_match:
+            return int(pages_match.group(1).replace(",", ""))
+        results_match = re.search(r"Search Results\s*\(([\d,]+)\)", text, re.IGNORECASE)
+        if results_match:
+            results = int(results_match.group(1).replace(",", ""))
+            return -(-results // self.page_count)
+        return None
+
+
     def check_if_file_exists(self, file_path):
         return os.path.exists(file_path)
 
 
-    def download_pdf_from_link(self, link, file_path):
+    def download_pdf_from_link(self, link, file_path, response=None):
+        # Returns PDF_DONE if the PDF was downloaded or already exists, PDF_MISSING if the article has no
+        # downloadable PDF (a terminal failure) and PDF_FAILED for errors worth retrying
+        pdf_status = PDF_FAILED
         try:
-            # Send a GET request to the link
-            response = requests.get(link)
+            # Send a GET request to the link (unless the page was already fetched by the caller)
+            if response is None:
+                response = self.fetch(link)
 
             # Check if the request was successful
             if response.status_code == 200:
@@ -75,56 +203,61 @@ class MDPIArticleScraper:
                                 doi_link = doi_link.replace("/", '___')
                                 pdf_file_name = doi_link
                             else:
+                                # Without a DOI the file is named after the article url, so articles don't share a file
                                 doi_link = None
-                                pdf_file_name = "unknown_pdf"
+                                pdf_file_name = "unknown_pdf_" + urlparse(link).path.strip("/").replace("/", "_")
 
                             # Create a file path with the PDF file name for saving the PDF file
                             pdf_file_path = os.path.join(file_path, f"{pdf_file_name}.pdf")
 
                             # Check if the PDF file has already been downloaded
                             if not self.check_if_file_exists(pdf_file_path):
-                                retry_count = 0
-                                max_retries = 2
-                                while retry_count < max_retries:
-                                    pdf_response = requests.get(pdf_href)
-
-                                    if pdf_response.status_code == 200:
-                                        # Save the PDF content to the specified file path
-                                        with open(pdf_file_path, 'wb') as f:
-                                            f.write(pdf_response.content)
-                                        print(f"PDF downloaded successfully and saved to: {pdf_file_path}")
-                                        time.sleep(4)
-                                        break  # Exit the loop if successful
-
-                                    elif pdf_response.status_code == 429:
-                                        print(f"Error: Too many requests (status code 429). Retrying in 15 minutes...")
-                                        time.sleep(900)  # Wait for 10 minutes
-                                        retry_count += 1
-                                    else:
-                                        print(f"Error: Could not download the PDF. Response status code: {pdf_response.status_code}")
-                                        break  # Exit the loop if not successful
+                                pdf_response = self.fetch(pdf_href)
+
+                                if pdf_response.status_code == 200:
+                                    # Save the PDF content to the specified file path
+                                    with open(pdf_file_path, 'wb') as f:
+                                        f.write(pdf_response.content)
+                                    print(f"PDF downloaded successfully and saved to: {pdf_file_path}")
+                                    self.report("pdf", path=pdf_file_path, bytes=len(pdf_response.content))
+                                    pdf_status = PDF_DONE
+                                else:
+                                    print(f"Error: Could not download the PDF. Response status code: {pdf_response.status_code}")
+                                    if pdf_response.status_code in MISSING_STATUS:
+                                        pdf_status = PDF_MISSING
+                                    self.report("error", url=pdf_href, message=f"PDF status code {pdf_response.status_code}")
                             else:
                                 print(f"PDF file already exists: {pdf_file_path}")
+                                pdf_status = PDF_DONE
 
                             if doi_link:
                                 print(f"DOI link found: {doi_link}")
                         else:
                             print(f"Error: 'bib-identity' div not found in the page: {link}")
+                            pdf_status = PDF_MISSING
                     else:
                         print(f"Error: PDF link not found in the page: {link}")
+                        pdf_status = PDF_MISSING
                 else:
                     print(f"Error: Link with class 'UD_ArticlePDF' not found in the page: {link}")
+                    pdf_status = PDF_MISSING
             else:
                 print(f"Error: Could not retrieve the page. Response status code: {response.status_code}")
 
+        except ScrapeStopped:
+            raise
         except Exception as e:
             print(f"Error while downloading PDF: {e}")
+            self.report("error", url=link, message=str(e))
+
+        return pdf_status
 
 
-    def find_metadata_elements(self, link):
+    def find_metadata_elements(self, link, response=None):
         try:
-            # Send a GET request to the link
-            response = requests.get(link)
+            # Send a GET request to the link (unless the page was already fetched by the caller)
+            if response is None:
+                response = self.fetch(link)
 
             # Check if the request was successful
             if response.status_code == 200:
@@ -179,6 +312,8 @@ class MDPIArticleScraper:
             else:
                 print(f"Error: Could not retrieve the page. Response status code: {response.status_code}")
 
+        except ScrapeStopped:
+            raise
         except Exception as e:
             print(f"Error while finding metadata elements: {e}")
 
@@ -200,55 +335,242 @@ class MDPIArticleScraper:
             bib_file.write("\n")
 
 
-    def scan_urls(self):
-        while True:
-            link = f"{self.base_url}&page_no={self.page}&page_count={self.page_count}&year_from={self.year_from}&year_to={self.year_to}&view=default"
-            response = requests.get(link)
+    def write_article_bib(self, metadata):
+        bib_id = self.generate_bib_id(metadata.get("doi", "No_DOI"))
+        bib_filename = os.path.join(self.file_path, f"{bib_id}.bib")
 
-            if response.status_code == 200:
-                links = self.extract_links_from_class(link)
-                if not links:
-                    break
+        with open(bib_filename, 'w', encoding='utf-8') as bib_file:
+            bib_file.write(f"@article{{{bib_id},")
+            bib_file.write("\n")
 
-                # Store page and year_from information in a text file
-                info_text = f"Page: {self.page}, Year: {self.year_from}"
-                with open(os.path.join(self.file_path, r"F:\MDPI_run\checkpoint.txt"), "w") as info_file:
-                    info_file.write(info_text)
+            sorted_metadata = {k: metadata.get(k, "Not found") for k in ["doi", "url", "year", "month", "publisher", "volume", "number", "author", "title", "journal"]}
 
-                print('Articles from year:', self.year_from, ' - Page:', self.page)
-                print(f"The link {link} is valid")
+            for key, value in sorted_metadata.items():
+                bib_file.write(f"  {key} = {{{value}}},")
+                bib_file.write("\n")
+
+            bib_file.write("}")
+            bib_file.write("\n")
 
-                for link in links:
-                    self.download_pdf_from_link(link=link, file_path=self.file_path)
-                    metadata = self.find_metadata_elements(link=link)
+        print(f"Metadata saved to {bib_filename}")
+        return bib_filename
 
-                    if metadata:
-                        bib_id = self.generate_bib_id(metadata.get("doi", "No_DOI"))
-                        bib_filename = os.path.join(self.file_path, f"{bib_id}.bib")
 
-                        with open(bib_filename, 'w', encoding='utf-8') as bib_file:
-                            bib_file.write(f"@article{{{bib_id},")
-                            bib_file.write("\n")
+    def process_article(self, link):
+        # Returns True once both the PDF and the bib file of the article are done
+        state = self.journal.article_state(link) or {}
+        pdf_done = state.get("pdf_done", False)
+        bib_done = state.get("bib_done", False)
 
-                            sorted_metadata = {k: metadata.get(k, "Not found") for k in ["doi", "url", "year", "month", "publisher", "volume", "number", "author", "title", "journal"]}
+        # The article page is fetched once and shared by the PDF download and the metadata lookup
+        try:
+            response = self.fetch(link)
+        except ScrapeStopped:
+            raise
+        except Exception as e:
+            print(f"Error while fetching the article page: {e}")
+            self.report("error", url=link, message=str(e))
+            return False
+        if response.status_code != 200:
+            print(f"Error: Could not retrieve the page. Response status code: {response.status_code}")
+            self.report("error", url=link, message=f"Article page status code {response.status_code}")
+            return False
+
+        metadata = self.find_metadata_elements(link=link, response=response)
+        doi = metadata.get("doi") if metadata else None
+        self.journal.mark_page_fetched(link, doi)
+
+        pdf_status = PDF_DONE if pdf_done else None
+        if not pdf_done:
+            pdf_status = self.download_pdf_from_link(link=link, file_path=self.file_path, response=response)
+            pdf_done = pdf_status == PDF_DONE
+            if pdf_done:
+                self.journal.mark_pdf_done(link, doi)
+        else:
+            print(f"PDF already done according to the crawl journal: {link}")
 
-                            for key, value in sorted_metadata.items():
-                                bib_file.write(f"  {key} = {{{value}}},")
-                                bib_file.write("\n")
+        if metadata and not bib_done:
+            self.write_article_bib(metadata)
+            self.journal.mark_bib_done(link, doi)
+            bib_done = True
 
-                            bib_file.write("}")
-                            bib_file.write("\n")
+        if pdf_done and bib_done and doi:
+            self.journal.mark_seen(doi, link)
+            if self.doi_index is not None:
+                pdf_file_path = os.path.join(self.file_path, f"{doi.replace('/', '___')}.pdf")
+                self.doi_index.record(doi, "mdpi", pdf_file_path)
+        elif pdf_status == PDF_MISSING and bib_done and doi:
+            # The article has no downloadable PDF, the incremental mode must not fetch it again every run
+            self.journal.mark_seen(doi, link, status="pdf_missing")
 
-                        print(f"Metadata saved to {bib_filename}")
+        self.report("article", url=link, doi=doi, pdf_done=pdf_done, bib_done=bib_done)
+        return pdf_done and bib_done
 
-                    print('-' * 100)
 
-                self.page += 1
+    def scan_urls(self):
+        query = self.query_key()
+
+        # Skip listing pages the journal already marked as completed
+        resume_page = self.journal.resume_page(query, self.page)
+        if resume_page != self.page:
+            print(f"Skipping pages {self.page} - {resume_page - 1}, already completed according to the crawl journal")
+            self.page = resume_page
+
+        while not self.stop_event.is_set():
+            link = self.listing_url(self.page)
+
+            # Reuse the links of a listing page seen in an interrupted run
+            links = self.journal.page_links(query, self.page)
+            response = None
+            if links is None:
+                response = self.fetch(link)
+
+                if response.status_code in THROTTLED_STATUS:
+                    # Still throttled after the longest backoff, the host cooldown delays the retry of the page
+                    print(f"The link {link} is throttled, retrying")
+                    continue
+
+                if response.status_code != 200:
+                    print(f"The link {link} is not valid")
+                    self.report("error", url=link, message=f"Listing page status code {response.status_code}")
+                    break
+
+                links = self.extract_links_from_class(link, response=response)
+                if not links:
+                    break
+                self.journal.record_page(query, self.page, links)
+                print(f"The link {link} is valid")
             else:
+                print(f"Links of page {self.page} loaded from the crawl journal")
+
+            # Store page and year_from information in a text file
+            info_text = f"Page: {self.page}, Year: {self.year_from}"
+            with open(os.path.join(self.file_path, self.checkpoint_path), "w") as info_file:
+                info_file.write(info_text)
+
+            print('Articles from year:', self.year_from, ' - Page:', self.page)
+            self.report("page", page=self.page, articles=len(links))
+
+            # Articles with both the PDF and the bib file done (here or by another source) are skipped without any request
+            completed = self.journal.completed_urls(links)
+            indexed = self.indexed_urls(links, response=response)
+            page_done = True
+            for link in links:
+                if self.stop_event.is_set():
+                    # The current page is kept, a resumed scan continues with its remaining articles
+                    print(f"Scan stopped on page {self.page}")
+                    return
+                if link in completed:
+                    print(f"Skipping {link}, already completed according to the crawl journal")
+                    self.report("skipped", url=link)
+                    continue
+                if link in indexed:
+                    print(f"Skipping {link}, already downloaded according to the DOI index")
+                    self.report("skipped", url=link)
+                    continue
+
+                page_done = self.process_article(link) and page_done
+                print('-' * 100)
+
+            # A page with unfinished articles is resumed on the next run, without fetching the listing again
+            if page_done:
+                self.journal.mark_page_done(query, self.page)
+            self.page += 1
+
+
+    def process_new_article(self, link):
+        # An article that didn't reach a final state (done or failed for good) is stored and retried by the next
+        # incremental run, the high-water mark moves past it
+        finished = self.process_article(link) or link in self.journal.known_urls([link])
+        if finished:
+            self.journal.clear_pending(link)
+        else:
+            print(f"Article {link} is unfinished, it is retried by the next incremental run")
+            self.journal.mark_pending(link, self.year_from, self.year_to)
+
+
+    def scan_new_articles(self, known_limit=20):
+        # Walk the newest pages first and stop after known_limit consecutive articles that are already known
+        mark = self.journal.high_water_mark(self.year_from, self.year_to)
+        if mark:
+            print(f"Last incremental run for {self.year_from} - {self.year_to}: {mark['updated']}, newest article: {mark['url']}")
+
+        # Unfinished articles of earlier runs may lie below the high-water mark, they are retried directly
+        retried = self.journal.pending_urls(self.year_from, self.year_to)
+        for link in retried:
+            if self.stop_event.is_set():
+                print("Scan stopped while retrying unfinished articles")
+                return
+            print(f"Retrying {link}, unfinished in an earlier run")
+            self.report("new", url=link)
+            self.process_new_article(link)
+            print('-' * 100)
+
+        page = 1
+        consecutive_known = 0
+        newest_link = None
+        finished = False
+
+        while not finished:
+            link = self.listing_url(page)
+            response = self.fetch(link)
+
+            if response.status_code in THROTTLED_STATUS:
+                print(f"The link {link} is throttled, retrying")
+                continue
+
+            if response.status_code != 200:
                 print(f"The link {link} is not valid")
-                self.year_from -= 1
+                self.report("error", url=link, message=f"Listing page status code {response.status_code}")
+                return
 
+            links = self.extract_links_from_class(link, response=response)
+            if not links:
                 break
+            if newest_link is None:
+                newest_link = links[0]
+
+            print('New articles from year:', self.year_from, ' - Page:', page)
+            self.report("page", page=page, articles=len(links))
+
+            known = self.journal.known_urls(links)
+            indexed = self.indexed_urls(links, response=response)
+            for link in links:
+                if self.stop_event.is_set():
+                    # The high-water mark is only moved by a complete run
+                    print(f"Scan stopped on page {page}")
+                    return
+                if mark and link == mark["url"]:
+                    # Everything from here on was already walked by the previous run
+                    print("Reached the newest article of the last run, stopping")
+                    finished = True
+                    break
+                if link in indexed and link not in known:
+                    # Downloaded by another source: remembered as seen, so it counts as known in this and later runs
+                    print(f"Skipping {link}, already downloaded according to the DOI index")
+                    self.journal.mark_seen(indexed[link], link, status="indexed")
+                    self.report("skipped", url=link)
+                    known.add(link)
+                if link in known:
+                    consecutive_known += 1
+                    if consecutive_known >= known_limit:
+                        print(f"Found {consecutive_known} consecutive known articles, stopping")
+                        finished = True
+                        break
+                    continue
+
+                consecutive_known = 0
+                if link in retried:
+                    # Already retried above in this run
+                    continue
+                self.report("new", url=link)
+                self.process_new_article(link)
+                print('-' * 100)
+
+            page += 1
+
+        if newest_link:
+            self.journal.set_high_water_mark(self.year_from, self.year_to, newest_link, page - 1)
 
 
 if __name__ == "__main__":
@@ -259,5 +581,22 @@ if __name__ == "__main__":
     file_path = r'F:\MDPI'
     page = 40080
 
-    scraper = MDPIArticleScraper(base_url, year_from, year_to, page_count, file_path, page)
-    scraper.scan_urls()
+    parser = argparse.ArgumentParser(description="Scrape articles from MDPI")
+    parser.add_argument("--incremental", action="store_true", help="Only fetch articles published since the last run")
+    parser.add_argument("--known_limit", type=int, default=20,
+                        help="Number of consecutive known articles that stops the incremental run")
+    parser.add_argument("--doi_index",
+                        help=r"Path of the DOI index shared with the fatcat scraper, e.g. S:\doi_index.db (optional)")
+    args = parser.parse_args()
+
+    doi_index = None
+    if args.doi_index:
+        # doi_index.py lives in the repository root, which has to be on PYTHONPATH
+        from doi_index import DoiIndex
+        doi_index = DoiIndex(args.doi_index)
+
+    scraper = MDPIArticleScraper(base_url, year_from, year_to, page_count, file_path, page, doi_index=doi_index)
+    if args.incremental:
+        scraper.scan_new_articles(known_limit=args.known_limit)
+    else:
+        scraper.scan_urls()
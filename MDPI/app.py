@@ -1,12 +1,61 @@
+import time
 import streamlit as st
 from MDPI_paper_download import MDPIArticleScraper
-import sys
+from scrape_job import ScrapeJob
 
-# Redirect the print output to Streamlit
-def st_stdout_redirector(text):
-    st.text(text)
 
-sys.stdout.write = st_stdout_redirector
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s"
+
+
+# Render the progress of the background job
+def show_progress(job):
+    snapshot = job.progress.snapshot()
+    st.subheader(f"Job state: {job.state}")
+    if job.error:
+        st.error(job.error)
+
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Pages", snapshot["pages"])
+    col2.metric("Articles", snapshot["articles"])
+    col3.metric("PDFs", snapshot["pdfs"])
+    col4.metric("Downloaded", f"{snapshot['bytes'] / 1024 / 1024:.1f} MB")
+    col5.metric("Errors", snapshot["errors"])
+
+    st.caption(
+        f"Current page: {snapshot['current_page']} of ~{snapshot['estimated_pages'] or '?'} | "
+        f"{snapshot['pages_per_hour']:.0f} pages/h | {snapshot['articles_per_minute']:.1f} articles/min | "
+        f"{snapshot['bytes_per_second'] / 1024:.0f} kB/s | elapsed {format_duration(snapshot['elapsed'])} | "
+        f"ETA {format_duration(snapshot['eta_seconds'])}"
+    )
+
+    # Rate and backoff state of every host, the scan waits while a host is cooling down
+    rate_stats = job.scraper.rate_limiter.stats()
+    if rate_stats:
+        for host, state in rate_stats.items():
+            if state["cooldown_remaining"] > 0:
+                st.warning(f"{host} is throttled, the scan waits {state['cooldown_remaining']:.0f} s")
+        st.dataframe([{"host": host, **state} for host, state in rate_stats.items()])
+
+    # Display the latest events with scrolling
+    log = "\n".join(
+        f"{event['time']} {event['kind']:>9} " + ", ".join(f"{k}={v}" for k, v in event.items() if k not in ("time", "kind"))
+        for event in reversed(snapshot["events"])
+    )
+    st.text_area("Latest events", log, height=400, key="output_log")
+
+
+def open_doi_index(doi_index_path):
+    if not doi_index_path:
+        return None
+    # doi_index.py lives in the repository root, which has to be on PYTHONPATH
+    from doi_index import DoiIndex
+    return DoiIndex(doi_index_path)
+
 
 # Define the Streamlit app
 def main():
@@ -20,24 +69,42 @@ def main():
     file_path = st.sidebar.text_input("File Path", "S:/MDPI_from_48437")
     page_count = st.sidebar.selectbox("Page Count", [10, 50, 100, 200])
     page = int(st.sidebar.text_input("Starting Page", "1"))
+    incremental = st.sidebar.checkbox("Only new articles since last run", value=False)
+    known_limit = st.sidebar.number_input("Stop after consecutive known articles", min_value=1, value=20)
+    doi_index_path = st.sidebar.text_input("DOI Index (shared with fatcat, optional)", "") or None
+
+    # The job lives in the session state, so it survives the reruns of the script
+    job = st.session_state.get("job")
+    running = job is not None and job.running
+
+    # Add buttons to start, stop and resume scraping
+    if st.sidebar.button("Start Scraping", disabled=running):
+        scraper = MDPIArticleScraper(base_url, year_from, year_to, page_count, file_path, page,
+                                     doi_index=open_doi_index(doi_index_path))
+        job = st.session_state["job"] = ScrapeJob(scraper, incremental=incremental, known_limit=known_limit)
+        job.start()
+        running = True
+
+    if st.sidebar.button("Stop Scraping", disabled=not running):
+        job.stop()
+
+    if st.sidebar.button("Resume Scraping", disabled=running or job is None or job.state == "finished"):
+        # Continue the stopped job with its own configuration (the sidebar may have changed since), the crawl
+        # journal skips what it already finished
+        job = st.session_state["job"] = job.resumed()
+        job.start()
+        running = True
+
+    if job is not None:
+        scraper = job.scraper
+        st.sidebar.caption(f"Current job: {scraper.year_from} - {scraper.year_to}, {scraper.page_count} per page, "
+                           f"page {scraper.page}{', incremental' if job.incremental else ''}")
+        show_progress(job)
 
-    # Create an instance of your scraper
-    scraper = MDPIArticleScraper(base_url, year_from, year_to, page_count, file_path, page)
-
-    # Add a button to start scraping
-    if st.sidebar.button("Start Scraping"):
-        with st.spinner("Scraping in progress..."):
-            # Call your scan_urls method
-            scraper.scan_urls()
-
-        # Display the output of scan_urls with scrolling
-        st.subheader("Scan URLs Output:")
-        st.text_area(
-            "Output Log",
-            scraper.scan_urls_output,
-            height=400,  # Set the height parameter for scrolling
-            key="output_log",
-        )  # Enable scrolling
+    # Poll the job while it is running
+    if running:
+        time.sleep(2)
+        st.rerun()
 
 # Call the main function directly
 if __name__ == "__main__":
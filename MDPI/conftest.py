@@ -0,0 +1,88 @@
+import re
+
+import pytest
+
+import MDPI_paper_download
+from MDPI_paper_download import MDPIArticleScraper
+from rate_limiter import RateLimiter
+
+
+BASE_URL = "https://www.mdpi.com/search?sort=pubdate"
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.reason = "OK" if status_code == 200 else "Error"
+
+
+class FakeSite:
+    """
+    Stub of the MDPI search: articles (paths like "j/9/1", newest first) split into listing pages,
+    one article page and one PDF per article. status maps a url to the status code it returns instead of 200,
+    or to a list of status codes returned by the next requests only.
+    """
+
+    def __init__(self, articles, page_count=10):
+        self.articles = list(articles)
+        self.page_count = page_count
+        self.status = {}
+        self.requests = []
+
+    def article_url(self, article):
+        return "https://www.mdpi.com/" + article
+
+    def pdf_url(self, article):
+        return self.article_url(article) + "/pdf"
+
+    def doi(self, article):
+        return "10.3390/" + article.replace("/", ".")
+
+    def listing(self, page):
+        items = self.articles[(page - 1) * self.page_count:page * self.page_count]
+        return "".join(
+            f'<div class="article-content"><a class="title-link" href="{article}">Title</a>'
+            f'<a href="https://doi.org/{self.doi(article)}">DOI</a></div>' for article in items)
+
+    def article_page(self, article):
+        return (f'<meta name="citation_doi" content="{self.doi(article)}">'
+                f'<meta name="dc.title" content="Title of {article}">'
+                f'<meta name="dc.date" content="2020-03-05">'
+                f'<a class="UD_ArticlePDF" href="/{article}/pdf">PDF</a>'
+                f'<div class="bib-identity">https://doi.org/{self.doi(article)}</div>')
+
+    def get(self, url):
+        self.requests.append(url)
+        status = self.status.get(url)
+        if isinstance(status, list):
+            status = status.pop(0) if status else None
+        if status:
+            return FakeResponse(status)
+        page_match = re.search(r"[?&]page_no=(\d+)", url)
+        if page_match:
+            return FakeResponse(200, self.listing(int(page_match.group(1))).encode())
+        path = url[len("https://www.mdpi.com/"):]
+        if path.endswith("/pdf") and path[:-len("/pdf")] in self.articles:
+            return FakeResponse(200, b"%PDF-1.4")
+        if path in self.articles:
+            return FakeResponse(200, self.article_page(path).encode())
+        return FakeResponse(404)
+
+
+@pytest.fixture
+def site(monkeypatch):
+    fake_site = FakeSite([])
+    monkeypatch.setattr(MDPI_paper_download.requests, "get", fake_site.get)
+    return fake_site
+
+
+@pytest.fixture
+def make_scraper(tmp_path):
+    def make(page=1, page_count=10, doi_index=None):
+        # A limiter that never waits, the stubbed site doesn't throttle
+        rate_limiter = RateLimiter(rate=1000, burst=1000, max_rate=1000)
+        return MDPIArticleScraper(BASE_URL, 2020, 2020, page_count, str(tmp_path), page, rate_limiter=rate_limiter,
+                                  checkpoint_path=str(tmp_path / "checkpoint.txt"), doi_index=doi_index)
+    return make
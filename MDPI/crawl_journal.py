@@ -0,0 +1,254 @@
+import sqlite3
+import os
+import threading
+from datetime import datetime
+from urllib.request import pathname2url
+
+
+class CrawlJournal:
+    """
+    SQLite journal of a crawl. It remembers the article links of every listing page and the state
+    of every article (page fetched, PDF done, bib done), so that a restarted crawl can skip finished
+    pages and articles without sending any request.
+    """
+
+    def __init__(self, db_path, read_only=False):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        if read_only:
+            # For monitoring a journal another process is writing to: no schema changes, no write transactions
+            self.conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True,
+                                        check_same_thread=False)
+            return
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.conn:
+            tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS articles (
+                    url TEXT PRIMARY KEY,
+                    doi TEXT,
+                    query TEXT,
+                    page INTEGER,
+                    position INTEGER,
+                    page_fetched INTEGER NOT NULL DEFAULT 0,
+                    pdf_done INTEGER NOT NULL DEFAULT 0,
+                    bib_done INTEGER NOT NULL DEFAULT 0,
+                    updated TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS articles_doi ON articles (doi)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS articles_page ON articles (query, page)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    query TEXT,
+                    page INTEGER,
+                    article_count INTEGER,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    updated TEXT,
+                    PRIMARY KEY (query, page)
+                )
+            """)
+            # Index of articles that are fully processed, downloaded by another source or failed for good (status),
+            # used by the incremental mode
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS seen_dois (
+                    doi TEXT PRIMARY KEY,
+                    url TEXT,
+                    first_seen TEXT,
+                    status TEXT NOT NULL DEFAULT 'done'
+                )
+            """)
+            # Journals created before the status column was added
+            backfill = "seen_dois" not in tables
+            seen_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(seen_dois)")}
+            if "status" not in seen_columns:
+                self.conn.execute("ALTER TABLE seen_dois ADD COLUMN status TEXT NOT NULL DEFAULT 'done'")
+                backfill = True
+            self.conn.execute("CREATE INDEX IF NOT EXISTS seen_dois_url ON seen_dois (url)")
+            if backfill:
+                # One-time migration: articles finished before the index existed
+                self.conn.execute("""
+                    INSERT OR IGNORE INTO seen_dois (doi, url, first_seen)
+                    SELECT doi, url, updated FROM articles WHERE doi IS NOT NULL AND pdf_done = 1 AND bib_done = 1
+                """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS high_water_marks (
+                    year_from INTEGER,
+                    year_to INTEGER,
+                    url TEXT,
+                    doi TEXT,
+                    pages_scanned INTEGER,
+                    updated TEXT,
+                    PRIMARY KEY (year_from, year_to)
+                )
+            """)
+            # Articles of the incremental mode that failed with a retryable error, retried by the next run
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_articles (
+                    url TEXT PRIMARY KEY,
+                    year_from INTEGER,
+                    year_to INTEGER,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated TEXT
+                )
+            """)
+
+    def close(self):
+        self.conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock, self.conn:
+            return self.conn.execute(sql, params).fetchall()
+
+    def record_page(self, query, page, links):
+        # Store the article links of a listing page in their original order
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (query, page, article_count, completed, updated) VALUES (?, ?, ?, 0, ?)",
+                (query, page, len(links), now))
+            for position, url in enumerate(links):
+                self.conn.execute("""
+                    INSERT INTO articles (url, query, page, position, updated) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (url) DO UPDATE SET query = excluded.query, page = excluded.page,
+                        position = excluded.position
+                """, (url, query, page, position, now))
+
+    def page_links(self, query, page):
+        """
+        Returns: the article links stored for a listing page, or None if the page was never fetched.
+        """
+        rows = self._execute("SELECT article_count FROM pages WHERE query = ? AND page = ?", (query, page))
+        if not rows:
+            return None
+        links = [row[0] for row in self._execute(
+            "SELECT url FROM articles WHERE query = ? AND page = ? ORDER BY position", (query, page))]
+        # A partially stored page is fetched again
+        return links if len(links) == rows[0][0] else None
+
+    def mark_page_done(self, query, page):
+        self._execute("UPDATE pages SET completed = 1, updated = ? WHERE query = ? AND page = ?",
+                      (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), query, page))
+
+    def resume_page(self, query, page):
+        # Skip the run of completed pages starting at the given page
+        completed = {row[0] for row in self._execute(
+            "SELECT page FROM pages WHERE query = ? AND page >= ? AND completed = 1", (query, page))}
+        while page in completed:
+            page += 1
+        return page
+
+    def summary(self, query):
+        """
+        Returns: a dictionary with the number of listing pages and articles processed for the query.
+        """
+        pages_seen, pages_completed, last_page = self._execute(
+            "SELECT COUNT(*), COALESCE(SUM(completed), 0), MAX(page) FROM pages WHERE query = ?", (query,))[0]
+        articles, articles_fetched, pdfs_done, bibs_done = self._execute(
+            "SELECT COUNT(*), COALESCE(SUM(page_fetched), 0), COALESCE(SUM(pdf_done), 0), COALESCE(SUM(bib_done), 0) "
+            "FROM articles WHERE query = ?", (query,))[0]
+        return {"pages_seen": pages_seen, "pages_completed": pages_completed, "last_page": last_page,
+                "articles": articles, "articles_fetched": articles_fetched, "pdfs_done": pdfs_done,
+                "bibs_done": bibs_done}
+
+    def article_state(self, url):
+        rows = self._execute("SELECT doi, page_fetched, pdf_done, bib_done FROM articles WHERE url = ?", (url,))
+        if not rows:
+            return None
+        doi, page_fetched, pdf_done, bib_done = rows[0]
+        return {"doi": doi, "page_fetched": bool(page_fetched), "pdf_done": bool(pdf_done), "bib_done": bool(bib_done)}
+
+    def completed_urls(self, urls):
+        """
+        Returns: the subset of the given article urls whose PDF and bib file are both done.
+        """
+        urls = list(urls)
+        if not urls:
+            return set()
+        placeholders = ", ".join("?" * len(urls))
+        rows = self._execute(
+            f"SELECT url FROM articles WHERE url IN ({placeholders}) AND pdf_done = 1 AND bib_done = 1", urls)
+        return {row[0] for row in rows}
+
+    def dois_for_urls(self, urls):
+        """
+        Returns: a dictionary url -> DOI for the given article urls whose DOI is known.
+        """
+        urls = list(urls)
+        if not urls:
+            return {}
+        placeholders = ", ".join("?" * len(urls))
+        rows = self._execute(
+            f"SELECT url, doi FROM articles WHERE url IN ({placeholders}) AND doi IS NOT NULL", urls)
+        return dict(rows)
+
+    def _mark(self, url, column, doi=None):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._execute(f"""
+            INSERT INTO articles (url, doi, {column}, updated) VALUES (?, ?, 1, ?)
+            ON CONFLICT (url) DO UPDATE SET {column} = 1, doi = COALESCE(excluded.doi, articles.doi),
+                updated = excluded.updated
+        """, (url, doi, now))
+
+    def mark_page_fetched(self, url, doi=None):
+        self._mark(url, "page_fetched", doi)
+
+    def mark_pdf_done(self, url, doi=None):
+        self._mark(url, "pdf_done", doi)
+
+    def mark_bib_done(self, url, doi=None):
+        self._mark(url, "bib_done", doi)
+
+    def mark_seen(self, doi, url, status="done"):
+        # status is "done", "indexed" (downloaded by another source according to the DOI index) or the reason
+        # of a terminal failure (e.g. "pdf_missing"); "done" always wins
+        self._execute("""
+            INSERT INTO seen_dois (doi, url, first_seen, status) VALUES (?, ?, ?, ?)
+            ON CONFLICT (doi) DO UPDATE SET status = excluded.status WHERE excluded.status = 'done'
+        """, (doi, url, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), status))
+
+    def known_urls(self, urls):
+        """
+        Returns: the subset of the given article urls whose DOI is in the index of seen DOIs.
+        """
+        urls = list(urls)
+        if not urls:
+            return set()
+        placeholders = ", ".join("?" * len(urls))
+        rows = self._execute(f"SELECT url FROM seen_dois WHERE url IN ({placeholders})", urls)
+        return {row[0] for row in rows}
+
+    def high_water_mark(self, year_from, year_to):
+        rows = self._execute(
+            "SELECT url, doi, pages_scanned, updated FROM high_water_marks WHERE year_from = ? AND year_to = ?",
+            (year_from, year_to))
+        if not rows:
+            return None
+        url, doi, pages_scanned, updated = rows[0]
+        return {"url": url, "doi": doi, "pages_scanned": pages_scanned, "updated": updated}
+
+    def set_high_water_mark(self, year_from, year_to, url, pages_scanned):
+        # The DOI of the newest article is taken from the journal if it is known
+        rows = self._execute("SELECT doi FROM articles WHERE url = ?", (url,))
+        doi = rows[0][0] if rows else None
+        self._execute(
+            "INSERT OR REPLACE INTO high_water_marks (year_from, year_to, url, doi, pages_scanned, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (year_from, year_to, url, doi, pages_scanned, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def mark_pending(self, url, year_from, year_to):
+        self._execute("""
+            INSERT INTO pending_articles (url, year_from, year_to, attempts, updated) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (url) DO UPDATE SET attempts = pending_articles.attempts + 1, updated = excluded.updated
+        """, (url, year_from, year_to, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def clear_pending(self, url):
+        self._execute("DELETE FROM pending_articles WHERE url = ?", (url,))
+
+    def pending_urls(self, year_from, year_to):
+        """
+        Returns: the unfinished articles of the incremental mode for the year range, oldest failure first.
+        """
+        return [row[0] for row in self._execute(
+            "SELECT url FROM pending_articles WHERE year_from = ? AND year_to = ? ORDER BY updated, url",
+            (year_from, year_to))]
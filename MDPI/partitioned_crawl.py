@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from MDPI_paper_download import MDPIArticleScraper
+from crawl_journal import CrawlJournal
+from rate_limiter import RateLimiter, MIN_RATE
+
+
+def year_partitions(base_url, year_from, year_to):
+    # One partition per publication year
+    return [{"name": str(year), "base_url": base_url, "year_from": year, "year_to": year}
+            for year in range(year_from, year_to + 1)]
+
+
+def journal_partitions(base_url, journals, year_from, year_to):
+    # One partition per journal, using the journal filter of the MDPI search
+    return [{"name": journal, "base_url": f"{base_url}&journal={journal}", "year_from": year_from, "year_to": year_to}
+            for journal in journals]
+
+
+def partition_folder(file_path, partition):
+    return os.path.join(file_path, partition["name"])
+
+
+def make_scraper(partition, page_count, file_path, rate_limiter=None, doi_index=None):
+    # Every partition writes to its own shard folder, with its own journal and checkpoint
+    shard = partition_folder(file_path, partition)
+    return MDPIArticleScraper(partition["base_url"], partition["year_from"], partition["year_to"], page_count, shard,
+                              page=1, rate_limiter=rate_limiter,
+                              checkpoint_path=os.path.join(shard, "checkpoint.txt"), doi_index=doi_index)
+
+
+def estimate_partitions(partitions, page_count, file_path):
+    # Estimate (and cache) the number of listing pages of every partition
+    for partition in partitions:
+        shard = partition_folder(file_path, partition)
+        os.makedirs(shard, exist_ok=True)
+        info_path = os.path.join(shard, "partition.json")
+
+        if os.path.exists(info_path):
+            with open(info_path) as info_file:
+                partition["estimated_pages"] = json.load(info_file).get("estimated_pages")
+            if partition["estimated_pages"] is not None:
+                continue
+
+        partition["estimated_pages"] = make_scraper(partition, page_count, file_path).estimate_page_count()
+        print(f"Partition {partition['name']}: ~{partition['estimated_pages'] or '?'} pages")
+        # A failed estimate is not cached, the next start tries again
+        if partition["estimated_pages"] is not None:
+            with open(info_path, "w") as info_file:
+                json.dump(partition, info_file)
+
+    return partitions
+
+
+def worker_rate_limiter(rate):
+    # The worker's share of the total rate is also its ceiling, so the adaptive increase can't exceed it
+    return RateLimiter(rate=rate, max_rate=rate, min_rate=min(rate, MIN_RATE), burst=1)
+
+
+def crawl_partition(partition, page_count, file_path, rate, doi_index_path=None):
+    # Runs in a worker process, every worker opens its own connection to the DOI index
+    doi_index = None
+    if doi_index_path:
+        # doi_index.py lives in the repository root, which has to be on PYTHONPATH
+        from doi_index import DoiIndex
+        doi_index = DoiIndex(doi_index_path)
+    scraper = make_scraper(partition, page_count, file_path, rate_limiter=worker_rate_limiter(rate),
+                           doi_index=doi_index)
+    scraper.scan_urls()
+    return partition["name"]
+
+
+def partition_progress(partitions, page_count, file_path):
+    """
+    Returns: a list with the progress of every partition, read from the shard journals.
+    """
+    progress = []
+    for partition in partitions:
+        scraper = make_scraper(partition, page_count, file_path)
+        row = {"partition": partition["name"], "estimated_pages": partition.get("estimated_pages")}
+        if os.path.exists(scraper.journal_path):
+            # The workers are writing to the journals, they are only read here
+            try:
+                journal = CrawlJournal(scraper.journal_path, read_only=True)
+                try:
+                    row.update(journal.summary(scraper.query_key()))
+                finally:
+                    journal.close()
+            except sqlite3.Error as e:
+                print(f"Error while reading the progress of partition {partition['name']}: {e}")
+        progress.append(row)
+    return progress
+
+
+def print_progress(progress):
+    total_done = sum(row.get("pages_completed", 0) for row in progress)
+    total_estimated = sum(row["estimated_pages"] or 0 for row in progress)
+    print("-" * 100)
+    for row in progress:
+        print(f"{row['partition']:>12}: pages {row.get('pages_completed', 0)}/{row['estimated_pages'] or '?'}, "
+              f"articles fetched {row.get('articles_fetched', 0)}/{row.get('articles', 0)}, "
+              f"PDFs {row.get('pdfs_done', 0)}, bib files {row.get('bibs_done', 0)}")
+    print(f"{'total':>12}: pages {total_done}/{total_estimated or '?'}")
+    print("-" * 100)
+
+
+def crawl_partitioned(partitions, page_count, file_path, workers=4, rate=0.5, progress_interval=60,
+                      doi_index_path=None):
+    partitions = estimate_partitions(partitions, page_count, file_path)
+    # Biggest partitions first, so that the workers finish at about the same time
+    partitions.sort(key=lambda partition: partition.get("estimated_pages") or 0, reverse=True)
+
+    # The request rate is split between the workers, every process has its own limiter
+    worker_rate = rate / workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(crawl_partition, partition, page_count, file_path, worker_rate, doi_index_path)
+                   for partition in partitions}
+        while pending:
+            done, pending = wait(pending, timeout=progress_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    print(f"Partition {future.result()} finished")
+                except Exception as e:
+                    print(f"Error while crawling a partition: {e}")
+            print_progress(partition_progress(partitions, page_count, file_path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl MDPI in parallel, one partition per year or journal")
+    parser.add_argument("--base_url", default="https://www.mdpi.com/search?sort=pubdate")
+    parser.add_argument("--year_from", type=int, default=2017)
+    parser.add_argument("--year_to", type=int, default=2021)
+    parser.add_argument("--journals", nargs="*", help="Partition by these journals instead of by year")
+    parser.add_argument("--page_count", type=int, default=10)
+    parser.add_argument("--file_path", default=r'F:\MDPI')
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.5, help="Total requests per second over all workers")
+    parser.add_argument("--doi_index", help="Path of the DOI index shared with the fatcat scraper")
+    parser.add_argument("--progress", action="store_true", help="Only print the merged progress of the partitions")
+    args = parser.parse_args()
+
+    if args.journals:
+        partitions = journal_partitions(args.base_url, args.journals, args.year_from, args.year_to)
+    else:
+        partitions = year_partitions(args.base_url, args.year_from, args.year_to)
+
+    if args.progress:
+        print_progress(partition_progress(estimate_partitions(partitions, args.page_count, args.file_path),
+                                          args.page_count, args.file_path))
+    else:
+        crawl_partitioned(partitions, args.page_count, args.file_path, workers=args.workers, rate=args.rate,
+                          doi_index_path=args.doi_index)
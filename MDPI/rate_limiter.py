@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header value (delay in seconds or an HTTP date).
+    Returns: the number of seconds to wait, or None if the value is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# Lowest rate the adaptive backoff goes down to (requests per second)
+MIN_RATE = 0.02
+
+
+class _HostState:
+    __slots__ = ("rate", "tokens", "updated", "cooldown_until", "backoff", "requests", "throttled")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.cooldown_until = 0.0
+        self.backoff = 0.0
+        self.requests = 0
+        self.throttled = 0
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter shared by all requests of a scraper (listing pages, article pages and PDFs).
+    Every host has its own bucket, so a host that is cooling down after a 429 only blocks the threads
+    that want to talk to it. The rate grows slowly after successful requests and is halved on throttling.
+    """
+
+    def __init__(self, rate=0.5, burst=2, min_rate=MIN_RATE, max_rate=2.0,
+                 base_backoff=5.0, max_backoff=900.0, increase=0.01, max_retry_after=3600.0):
+        self.initial_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.increase = increase
+        # A Retry-After far in the future (e.g. a bogus HTTP date) is capped to this many seconds
+        self.max_retry_after = max_retry_after
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, url):
+        host = urlparse(url).netloc
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.initial_rate, self.burst)
+        return state
+
+    def _refill(self, state, now):
+        state.tokens = min(self.burst, state.tokens + (now - state.updated) * state.rate)
+        state.updated = now
+
+    def reserve(self, url):
+        """
+        Try to take a token for the host of the url without blocking.
+        Returns: 0 if the request may be sent now, otherwise the number of seconds to wait.
+        """
+        with self._lock:
+            state = self._state(url)
+            now = time.monotonic()
+            if now < state.cooldown_until:
+                return state.cooldown_until - now
+            self._refill(state, now)
+            if state.tokens >= 1:
+                state.tokens -= 1
+                state.requests += 1
+                return 0.0
+            return (1 - state.tokens) / state.rate
+
+    def acquire(self, url, stop_event=None):
+        """
+        Wait until a request to the host of the url may be sent. The wait (up to a whole cooldown) ends early
+        once the optional stop_event is set.
+        Returns: True if a token was taken, False if the wait was interrupted by the stop_event.
+        """
+        # Wait outside the lock so that requests to other hosts are not blocked
+        while True:
+            wait = self.reserve(url)
+            if wait <= 0:
+                return True
+            if stop_event is None:
+                time.sleep(wait)
+            elif stop_event.wait(wait):
+                return False
+
+    def success(self, url):
+        with self._lock:
+            state = self._state(url)
+            state.backoff = 0.0
+            state.rate = min(self.max_rate, state.rate + self.increase)
+
+    def throttle(self, url, retry_after=None):
+        """
+        Register a throttled response (429/503) for the host of the url.
+        Returns: the cooldown in seconds applied to the host.
+        """
+        with self._lock:
+            state = self._state(url)
+            state.throttled += 1
+            state.rate = max(self.min_rate, state.rate / 2)
+            state.backoff = min(self.max_backoff, max(self.base_backoff, state.backoff * 2))
+            # Full jitter on top of the server's hint, so parallel workers don't come back at the same moment
+            delay = random.uniform(state.backoff / 2, state.backoff)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_retry_after))
+            now = time.monotonic()
+            state.cooldown_until = max(state.cooldown_until, now + delay)
+            state.tokens = 0.0
+            state.updated = now
+            return delay
+
+    def backoff_exhausted(self, url):
+        # True once the backoff of the host reached max_backoff, i.e. throttling persists despite long cooldowns
+        with self._lock:
+            return self._state(url).backoff >= self.max_backoff
+
+    def stats(self):
+        """
+        Returns: a dictionary with the current rate and backoff state of every host, for monitoring.
+        """
+        with self._lock:
+            now = time.monotonic()
+            stats = {}
+            for host, state in self._hosts.items():
+                self._refill(state, now)
+                stats[host] = {
+                    "rate": round(state.rate, 4),
+                    "tokens": round(state.tokens, 2),
+                    "backoff": round(state.backoff, 1),
+                    "cooldown_remaining": round(max(0.0, state.cooldown_until - now), 1),
+                    "requests": state.requests,
+                    "throttled": state.throttled,
+                }
+            return stats
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from MDPI_paper_download import ScrapeStopped
+
+# Counters kept for every job, and the event kinds that increase them
+COUNTERS = ("pages", "articles", "pdfs", "bytes", "skipped", "new", "throttled", "errors")
+EVENT_COUNTERS = {"page": "pages", "article": "articles", "pdf": "pdfs", "skipped": "skipped", "new": "new",
+                  "throttled": "throttled", "error": "errors"}
+
+
+class ScrapeProgress:
+    """
+    Structured progress of a scrape: the latest events in a bounded ring buffer plus running counters.
+    Written by the scraper thread and read by the Streamlit app, so every access holds the lock.
+    """
+
+    def __init__(self, max_events=500):
+        self.events = deque(maxlen=max_events)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.current_page = None
+        self.estimated_pages = None
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, kind, **data):
+        with self._lock:
+            counter = EVENT_COUNTERS.get(kind)
+            if counter:
+                self.counters[counter] += 1
+            self.counters["bytes"] += data.get("bytes", 0)
+            if kind == "page":
+                self.current_page = data.get("page")
+            self.events.append({"time": datetime.now().strftime("%H:%M:%S"), "kind": kind, **data})
+
+    def snapshot(self, last_events=50):
+        """
+        Returns: a dictionary with the counters, throughput and ETA, and the most recent events.
+        """
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            counters = dict(self.counters)
+            events = list(self.events)[-last_events:]
+            current_page = self.current_page
+            estimated_pages = self.estimated_pages
+
+        pages_per_hour = counters["pages"] / elapsed * 3600
+        eta = None
+        if estimated_pages and current_page and counters["pages"]:
+            eta = max(0, estimated_pages - current_page) / (counters["pages"] / elapsed)
+
+        return {
+            **counters,
+            "elapsed": elapsed,
+            "current_page": current_page,
+            "estimated_pages": estimated_pages,
+            "pages_per_hour": pages_per_hour,
+            "articles_per_minute": counters["articles"] / elapsed * 60,
+            "bytes_per_second": counters["bytes"] / elapsed,
+            "eta_seconds": eta,
+            "events": events,
+        }
+
+
+class ScrapeJob:
+    """
+    Runs scan_urls (or scan_new_articles) of a scraper in a background thread.
+    A stopped job leaves the crawl journal consistent, so a new job with the same configuration resumes it.
+    """
+
+    def __init__(self, scraper, incremental=False, known_limit=20, max_events=500):
+        self.scraper = scraper
+        self.incremental = incremental
+        self.known_limit = known_limit
+        self.progress = ScrapeProgress(max_events=max_events)
+        self.state = "created"
+        self.error = None
+        self._thread = None
+
+    def start(self):
+        self.scraper.progress = self.progress
+        self.scraper.stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="mdpi-scrape-job", daemon=True)
+        self.state = "running"
+        self._thread.start()
+
+    def _run(self):
+        try:
+            if self.incremental:
+                self.scraper.scan_new_articles(known_limit=self.known_limit)
+            else:
+                self.progress.estimated_pages = self.scraper.estimate_page_count()
+                self.scraper.scan_urls()
+            self.state = "stopped" if self.scraper.stop_event.is_set() else "finished"
+        except ScrapeStopped:
+            # Stopped while waiting for the rate limiter, the interrupted article is resumed by the next job
+            print("Scan stopped while waiting for the rate limiter")
+            self.state = "stopped"
+        except Exception as e:
+            self.error = str(e)
+            self.progress.record("error", message=str(e))
+            self.state = "failed"
+
+    def stop(self):
+        # The scraper checks the flag between articles and the rate limiter wakes up from its wait,
+        # only a request already sent is finished first
+        self.scraper.stop_event.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def resumed(self):
+        """
+        Returns: a new job continuing this stopped job with the same scraper, i.e. the same query, the
+        current page and the same mode.
+        """
+        return ScrapeJob(self.scraper, incremental=self.incremental, known_limit=self.known_limit,
+                         max_events=self.progress.events.maxlen)
@@ -0,0 +1,91 @@
+import sqlite3
+
+from crawl_journal import CrawlJournal
+
+
+def seen_dois(journal):
+    return {row[0]: row[1] for row in journal._execute("SELECT doi, status FROM seen_dois")}
+
+
+def test_seen_dois_backfilled_once_from_journals_without_status(tmp_path):
+    path = str(tmp_path / "journal.db")
+    # Journal written before the status column of seen_dois existed
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE articles (url TEXT PRIMARY KEY, doi TEXT, query TEXT, page INTEGER, "
+                     "position INTEGER, page_fetched INTEGER NOT NULL DEFAULT 0, pdf_done INTEGER NOT NULL DEFAULT 0, "
+                     "bib_done INTEGER NOT NULL DEFAULT 0, updated TEXT)")
+        conn.execute("CREATE TABLE seen_dois (doi TEXT PRIMARY KEY, url TEXT, first_seen TEXT)")
+        conn.execute("INSERT INTO articles (url, doi, pdf_done, bib_done) VALUES ('u1', '10.1/a', 1, 1)")
+    conn.close()
+
+    journal = CrawlJournal(path)
+    assert seen_dois(journal) == {"10.1/a": "done"}
+    journal.close()
+
+
+def test_seen_dois_not_backfilled_on_every_open(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = CrawlJournal(path)
+    journal.mark_pdf_done("u1", "10.1/a")
+    journal.mark_bib_done("u1", "10.1/a")
+    journal.close()
+
+    # Only process_article marks an article as seen, reopening the journal doesn't
+    journal = CrawlJournal(path)
+    assert seen_dois(journal) == {}
+    journal.close()
+
+
+def test_mark_seen_keeps_done(tmp_path):
+    journal = CrawlJournal(str(tmp_path / "journal.db"))
+    journal.mark_seen("10.1/a", "u1", status="pdf_missing")
+    journal.mark_seen("10.1/b", "u2")
+    journal.mark_seen("10.1/a", "u1")
+    journal.mark_seen("10.1/b", "u2", status="pdf_missing")
+
+    assert seen_dois(journal) == {"10.1/a": "done", "10.1/b": "done"}
+    assert journal.known_urls(["u1", "u2", "u3"]) == {"u1", "u2"}
+
+
+def test_page_links_and_resume_page(tmp_path):
+    journal = CrawlJournal(str(tmp_path / "journal.db"))
+    journal.record_page("q", 1, ["u3", "u1", "u2"])
+    journal.record_page("q", 2, ["u4"])
+    journal.mark_page_done("q", 1)
+
+    assert journal.page_links("q", 1) == ["u3", "u1", "u2"]
+    assert journal.page_links("q", 3) is None
+    assert journal.page_links("other", 1) is None
+    assert journal.resume_page("q", 1) == 2
+    assert journal.resume_page("q", 2) == 2
+
+
+def test_partially_stored_page_is_fetched_again(tmp_path):
+    journal = CrawlJournal(str(tmp_path / "journal.db"))
+    journal.record_page("q", 1, ["u1", "u2"])
+    # The second link moved to another page of the same query
+    journal.record_page("q", 2, ["u2"])
+
+    assert journal.page_links("q", 1) is None
+    assert journal.page_links("q", 2) == ["u2"]
+
+
+def test_article_states_and_completed_urls(tmp_path):
+    journal = CrawlJournal(str(tmp_path / "journal.db"))
+    journal.record_page("q", 1, ["u1", "u2", "u3"])
+    journal.mark_page_fetched("u1", "10.1/a")
+    journal.mark_pdf_done("u1")
+    journal.mark_bib_done("u1")
+    journal.mark_page_fetched("u2", "10.1/b")
+    journal.mark_bib_done("u2", "10.1/b")
+
+    assert journal.completed_urls(["u1", "u2", "u3", "u4"]) == {"u1"}
+    assert journal.completed_urls([]) == set()
+    assert journal.article_state("u2") == {"doi": "10.1/b", "page_fetched": True, "pdf_done": False,
+                                           "bib_done": True}
+    assert journal.article_state("u4") is None
+    # A DOI already known is kept when an article is marked without one
+    assert journal.dois_for_urls(["u1", "u2", "u3"]) == {"u1": "10.1/a", "u2": "10.1/b"}
+    assert journal.summary("q") == {"pages_seen": 1, "pages_completed": 0, "last_page": 1, "articles": 3,
+                                    "articles_fetched": 2, "pdfs_done": 1, "bibs_done": 2}
@@ -0,0 +1,97 @@
+def listing_requests(site):
+    return [url for url in site.requests if "page_no=" in url]
+
+
+def test_first_run_processes_everything_and_sets_the_mark(site, make_scraper):
+    site.articles = [f"j/9/{i}" for i in range(5)]
+    scraper = make_scraper()
+
+    scraper.scan_new_articles(known_limit=3)
+
+    assert scraper.journal.known_urls(map(site.article_url, site.articles)) == set(map(site.article_url, site.articles))
+    assert scraper.journal.high_water_mark(2020, 2020)["url"] == site.article_url("j/9/0")
+
+
+def test_second_run_stops_at_the_mark(site, make_scraper):
+    site.articles = [f"j/9/{i}" for i in range(5)]
+    make_scraper().scan_new_articles(known_limit=20)
+
+    site.articles = ["j/9/6", "j/9/5"] + site.articles
+    site.requests.clear()
+    scraper = make_scraper()
+    scraper.scan_new_articles(known_limit=20)
+
+    # Only the two new articles are fetched, the listing walk ends at the previous newest article
+    assert site.article_url("j/9/6") in site.requests
+    assert site.article_url("j/9/5") in site.requests
+    assert site.article_url("j/9/0") not in site.requests
+    assert len(listing_requests(site)) == 1
+    assert scraper.journal.high_water_mark(2020, 2020)["url"] == site.article_url("j/9/6")
+
+
+def test_known_limit_stops_the_walk(site, make_scraper):
+    site.articles = [f"j/9/{i}" for i in range(25)]
+    site.page_count = 5
+    scraper = make_scraper(page_count=5)
+    for article in site.articles:
+        scraper.journal.mark_seen(site.doi(article), site.article_url(article))
+
+    scraper.scan_new_articles(known_limit=7)
+
+    # 7 known articles are on the first two pages
+    assert len(listing_requests(site)) == 2
+    assert not [url for url in site.requests if "page_no=" not in url]
+
+
+def test_unfinished_article_below_the_mark_is_retried(site, make_scraper):
+    site.articles = [f"j/9/{i}" for i in range(3)]
+    make_scraper().scan_new_articles(known_limit=20)
+
+    # Run 2: the PDF of a new article fails with a retryable error
+    site.articles = ["j/9/4", "j/9/3"] + site.articles
+    site.status[site.pdf_url("j/9/3")] = 500
+    scraper = make_scraper()
+    scraper.scan_new_articles(known_limit=20)
+    assert scraper.journal.high_water_mark(2020, 2020)["url"] == site.article_url("j/9/4")
+    assert scraper.journal.pending_urls(2020, 2020) == [site.article_url("j/9/3")]
+
+    # Run 3: the article lies below the new mark, but is retried and finished
+    del site.status[site.pdf_url("j/9/3")]
+    site.requests.clear()
+    scraper = make_scraper()
+    scraper.scan_new_articles(known_limit=20)
+
+    assert site.pdf_url("j/9/3") in site.requests
+    assert site.article_url("j/9/3") in scraper.journal.known_urls([site.article_url("j/9/3")])
+    assert scraper.journal.pending_urls(2020, 2020) == []
+
+
+def test_missing_pdf_is_final(site, make_scraper):
+    site.articles = ["j/9/1", "j/9/0"]
+    site.status[site.pdf_url("j/9/1")] = 404
+    scraper = make_scraper()
+
+    scraper.scan_new_articles(known_limit=20)
+
+    assert scraper.journal.pending_urls(2020, 2020) == []
+    assert scraper.journal.known_urls([site.article_url("j/9/1")]) == {site.article_url("j/9/1")}
+
+
+def test_indexed_articles_count_as_known(site, make_scraper, tmp_path):
+    from doi_index import DoiIndex
+
+    site.articles = [f"j/9/{i}" for i in range(25)]
+    site.page_count = 25
+    doi_index = DoiIndex(str(tmp_path / "doi_index.db"))
+    doi_index.record_many([(site.doi(article), "fatcat", None, "done") for article in site.articles])
+    scraper = make_scraper(page_count=25, doi_index=doi_index)
+
+    scraper.scan_new_articles(known_limit=20)
+
+    # No article page is requested, the walk stops after 20 articles downloaded by fatcat
+    assert site.requests == [scraper.listing_url(1)]
+    indexed = scraper.journal._execute("SELECT doi, status FROM seen_dois")
+    assert len(indexed) == 20
+    assert set(status for _, status in indexed) == {"indexed"}
+    assert (site.doi("j/9/0"), "indexed") in indexed
+    doi_index.close()
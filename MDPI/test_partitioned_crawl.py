@@ -0,0 +1,76 @@
+import json
+import os
+import sqlite3
+
+import partitioned_crawl
+from conftest import BASE_URL
+from MDPI_paper_download import MDPIArticleScraper
+
+
+def test_year_partitions():
+    partitions = partitioned_crawl.year_partitions(BASE_URL, 2019, 2021)
+
+    assert [partition["name"] for partition in partitions] == ["2019", "2020", "2021"]
+    assert all(partition["year_from"] == partition["year_to"] for partition in partitions)
+
+
+def test_worker_rate_limiter_stays_at_its_share():
+    rate_limiter = partitioned_crawl.worker_rate_limiter(0.125)
+    for _ in range(500):
+        rate_limiter.success("https://www.mdpi.com/a")
+
+    assert rate_limiter.stats()["www.mdpi.com"]["rate"] == 0.125
+
+
+def test_only_real_estimates_are_cached(tmp_path, monkeypatch):
+    estimates = iter([None, 42])
+    monkeypatch.setattr(MDPIArticleScraper, "estimate_page_count", lambda self: next(estimates))
+    partitions = partitioned_crawl.year_partitions(BASE_URL, 2020, 2020)
+    info_path = tmp_path / "2020" / "partition.json"
+
+    partitioned_crawl.estimate_partitions(partitions, 10, str(tmp_path))
+    assert partitions[0]["estimated_pages"] is None
+    assert not info_path.exists()
+
+    partitioned_crawl.estimate_partitions(partitions, 10, str(tmp_path))
+    assert partitions[0]["estimated_pages"] == 42
+    assert json.loads(info_path.read_text())["estimated_pages"] == 42
+
+    # The cached estimate is used without another request
+    partitioned_crawl.estimate_partitions(partitions, 10, str(tmp_path))
+    assert partitions[0]["estimated_pages"] == 42
+
+
+def test_progress_reads_journals_a_worker_is_writing(tmp_path):
+    partitions = partitioned_crawl.year_partitions(BASE_URL, 2020, 2020)
+    partitions[0]["estimated_pages"] = 3
+    scraper = partitioned_crawl.make_scraper(partitions[0], 10, str(tmp_path))
+    os.makedirs(scraper.file_path)
+    scraper.journal.record_page(scraper.query_key(), 1, ["a", "b"])
+    scraper.journal.mark_page_done(scraper.query_key(), 1)
+    # Journal of an older version, reading the progress must not migrate it
+    scraper.journal._execute("DROP TABLE pending_articles")
+
+    # A worker in the middle of a write transaction
+    worker = sqlite3.connect(scraper.journal_path)
+    worker.execute("BEGIN IMMEDIATE")
+    worker.execute("UPDATE pages SET updated = 'now'")
+    try:
+        progress = partitioned_crawl.partition_progress(partitions, 10, str(tmp_path))
+    finally:
+        worker.rollback()
+        worker.close()
+
+    assert progress[0]["pages_completed"] == 1
+    assert progress[0]["articles"] == 2
+    assert not scraper.journal._execute("SELECT name FROM sqlite_master WHERE name = 'pending_articles'")
+
+
+def test_progress_of_a_partition_without_journal(tmp_path):
+    partitions = partitioned_crawl.year_partitions(BASE_URL, 2020, 2020)
+    partitions[0]["estimated_pages"] = None
+
+    progress = partitioned_crawl.partition_progress(partitions, 10, str(tmp_path))
+
+    assert progress == [{"partition": "2020", "estimated_pages": None}]
+    assert not os.path.exists(tmp_path / "2020")
@@ -0,0 +1,115 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from rate_limiter import RateLimiter, parse_retry_after
+
+
+URL = "https://www.mdpi.com/search"
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(" 5 ") == 5.0
+
+
+def test_parse_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=60)
+    assert 55 <= parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 60
+    # A date in the past means "retry now"
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_parse_retry_after_missing_or_invalid():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+
+
+def test_throttle_halves_the_rate_and_doubles_the_backoff():
+    rate_limiter = RateLimiter(rate=1.0, min_rate=0.1, base_backoff=5.0, max_backoff=20.0)
+
+    delays = [rate_limiter.throttle(URL) for _ in range(5)]
+    stats = rate_limiter.stats()["www.mdpi.com"]
+
+    assert stats["rate"] == 0.1
+    assert stats["backoff"] == 20.0
+    assert stats["throttled"] == 5
+    assert 2.5 <= delays[0] <= 5.0
+    assert all(delay <= 20.0 for delay in delays)
+
+
+def test_backoff_exhausted_after_max_backoff_and_reset_by_success():
+    rate_limiter = RateLimiter(base_backoff=5.0, max_backoff=20.0)
+
+    exhausted = []
+    for _ in range(4):
+        rate_limiter.throttle(URL)
+        exhausted.append(rate_limiter.backoff_exhausted(URL))
+    assert exhausted == [False, False, True, True]
+
+    rate_limiter.success(URL)
+    assert not rate_limiter.backoff_exhausted(URL)
+
+
+def test_retry_after_is_honoured_and_capped():
+    rate_limiter = RateLimiter(base_backoff=1.0, max_retry_after=100.0)
+
+    assert rate_limiter.throttle(URL, retry_after=30.0) == 30.0
+    assert rate_limiter.throttle(URL, retry_after=10 ** 6) == 100.0
+
+
+def test_cooldown_only_blocks_the_throttled_host():
+    rate_limiter = RateLimiter(rate=1.0, burst=2)
+    rate_limiter.throttle(URL)
+
+    assert rate_limiter.reserve(URL) > 0
+    assert rate_limiter.reserve("https://other.example/") == 0
+
+
+def test_burst_then_wait():
+    rate_limiter = RateLimiter(rate=0.5, burst=2)
+
+    assert rate_limiter.reserve(URL) == 0
+    assert rate_limiter.reserve(URL) == 0
+    assert 1.9 <= rate_limiter.reserve(URL) <= 2.0
+
+
+def test_acquire_is_interrupted_by_the_stop_event():
+    rate_limiter = RateLimiter()
+    rate_limiter.throttle(URL, retry_after=600.0)
+    stop_event = threading.Event()
+    threading.Timer(0.05, stop_event.set).start()
+
+    assert rate_limiter.acquire(URL, stop_event) is False
+
+
+def test_success_raises_the_rate_up_to_max_rate():
+    rate_limiter = RateLimiter(rate=0.5, max_rate=0.6, increase=0.05)
+    for _ in range(10):
+        rate_limiter.success(URL)
+
+    assert rate_limiter.stats()["www.mdpi.com"]["rate"] == 0.6
+
+
+def test_fetch_retries_until_the_backoff_is_exhausted(site, make_scraper):
+    scraper = make_scraper()
+    scraper.rate_limiter.base_backoff = 0.001
+    scraper.rate_limiter.max_backoff = 0.004
+    site.status["https://www.mdpi.com/j/1"] = 429
+
+    response = scraper.fetch("https://www.mdpi.com/j/1")
+
+    # Cooldowns of 0.001, 0.002 and 0.004 s, the answer after the longest one is returned
+    assert response.status_code == 429
+    assert len(site.requests) == 4
+
+
+def test_fetch_returns_once_throttling_ends(site, make_scraper):
+    scraper = make_scraper()
+    scraper.rate_limiter.base_backoff = 0.001
+    site.articles = ["j/1"]
+    site.status["https://www.mdpi.com/j/1"] = [503]
+
+    assert scraper.fetch("https://www.mdpi.com/j/1").status_code == 200
+    assert site.requests == ["https://www.mdpi.com/j/1"] * 2
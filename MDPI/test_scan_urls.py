@@ -0,0 +1,60 @@
+import os
+
+
+def test_scan_resumes_mid_page_without_refetching(site, make_scraper):
+    site.articles = [f"j/9/{i}" for i in range(4)]
+    site.page_count = 2
+    scraper = make_scraper(page_count=2)
+    original_process = scraper.process_article
+
+    def process_then_stop(link):
+        result = original_process(link)
+        scraper.stop_event.set()
+        return result
+
+    scraper.process_article = process_then_stop
+    scraper.scan_urls()
+    assert site.requests == [scraper.listing_url(1), site.article_url("j/9/0"), site.pdf_url("j/9/0")]
+
+    # A restarted scan from the first page continues with the second article of the page
+    site.requests.clear()
+    scraper = make_scraper(page_count=2)
+    scraper.scan_urls()
+
+    assert scraper.listing_url(1) not in site.requests
+    assert site.article_url("j/9/0") not in site.requests
+    assert site.article_url("j/9/1") in site.requests
+    assert site.article_url("j/9/3") in site.requests
+    query = scraper.query_key()
+    assert scraper.journal.resume_page(query, 1) == 3
+
+    # Everything is done, a third scan only asks for the page after the last one
+    site.requests.clear()
+    make_scraper(page_count=2).scan_urls()
+    assert site.requests == [scraper.listing_url(3)]
+
+
+def test_page_with_failed_article_is_not_completed(site, make_scraper):
+    site.articles = ["j/9/0", "j/9/1"]
+    site.status[site.pdf_url("j/9/1")] = 500
+    scraper = make_scraper()
+
+    scraper.scan_urls()
+
+    assert scraper.journal.resume_page(scraper.query_key(), 1) == 1
+    assert scraper.journal.completed_urls([site.article_url("j/9/0"), site.article_url("j/9/1")]) == {
+        site.article_url("j/9/0")}
+
+
+def test_pdfs_without_doi_get_distinct_file_names(site, make_scraper, tmp_path):
+    site.articles = ["j/9/0", "j/9/1"]
+    # Article pages without a DOI in the bib-identity
+    site.article_page = lambda article: (f'<a class="UD_ArticlePDF" href="/{article}/pdf">PDF</a>'
+                                         f'<div class="bib-identity">Sensors 2020, 20</div>')
+    scraper = make_scraper()
+
+    for article in site.articles:
+        scraper.download_pdf_from_link(site.article_url(article), str(tmp_path))
+
+    assert os.path.exists(tmp_path / "unknown_pdf_j_9_0.pdf")
+    assert os.path.exists(tmp_path / "unknown_pdf_j_9_1.pdf")
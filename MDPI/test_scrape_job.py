@@ -0,0 +1,48 @@
+from scrape_job import ScrapeJob, ScrapeProgress
+
+
+def test_progress_counters_and_ring_buffer():
+    progress = ScrapeProgress(max_events=3)
+    progress.record("page", page=7, articles=10)
+    for _ in range(4):
+        progress.record("pdf", bytes=100)
+
+    snapshot = progress.snapshot()
+    assert snapshot["pages"] == 1
+    assert snapshot["pdfs"] == 4
+    assert snapshot["bytes"] == 400
+    assert snapshot["current_page"] == 7
+    assert len(snapshot["events"]) == 3
+
+
+def test_resumed_job_keeps_the_configuration_of_the_stopped_job(site, make_scraper):
+    site.articles = [f"j/9/{i}" for i in range(4)]
+    site.page_count = 2
+    scraper = make_scraper(page_count=2)
+    job = ScrapeJob(scraper, incremental=False)
+    # Stop after the first article
+    original_process = scraper.process_article
+
+    def process_article(link):
+        result = original_process(link)
+        job.stop()
+        return result
+
+    scraper.process_article = process_article
+    job.start()
+    job._thread.join(10)
+    assert job.state == "stopped"
+    scraper.process_article = original_process
+
+    resumed = job.resumed()
+    assert resumed.scraper is scraper
+    assert resumed.incremental is False
+    site.requests.clear()
+    resumed.start()
+    resumed._thread.join(10)
+
+    assert resumed.state == "finished"
+    # The first article and the stored listing page are not fetched again
+    assert site.article_url("j/9/0") not in site.requests
+    assert site.article_url("j/9/1") in site.requests
+    assert scraper.journal.summary(scraper.query_key())["pages_completed"] == 2
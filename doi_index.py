@@ -0,0 +1,162 @@
+import argparse
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+# SQLite limits the number of parameters of a query, lookups are split into chunks of this size
+LOOKUP_CHUNK = 500
+
+DOI_PREFIXES = ("https://doi.org/", "http://doi.org/", "https://dx.doi.org/", "http://dx.doi.org/", "doi:")
+BIB_DOI_PATTERN = re.compile(r"^\s*doi\s*=\s*\{([^}]*)\}", re.IGNORECASE | re.MULTILINE)
+
+
+def normalize_doi(doi):
+    """
+    Normalizes a DOI from any of the scrapers: strips URL and "doi:" prefixes, turns the "___" used in
+    MDPI file names back into "/" and lowercases it (DOIs are case insensitive).
+    Returns: the normalized DOI, or None if the value is not a DOI.
+    """
+    if not doi or not isinstance(doi, str):
+        return None
+    doi = doi.strip()
+    for prefix in DOI_PREFIXES:
+        if doi.lower().startswith(prefix):
+            doi = doi[len(prefix):]
+    doi = doi.replace("___", "/").strip().lower()
+    # Placeholders such as "Not found" or "No_DOI" are not DOIs
+    return doi if doi.startswith("10.") else None
+
+
+class DoiIndex:
+    """
+    Persistent index shared by the fatcat and MDPI scrapers: normalized DOI -> source, path, status.
+    Both scrapers look up the DOIs of a batch before sending any request and record every finished paper,
+    so a paper already downloaded by one of them is never downloaded by the other.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Several scraper processes can share the index, wait for their writes instead of failing
+        self.conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS dois (
+                    doi TEXT PRIMARY KEY,
+                    source TEXT,
+                    path TEXT,
+                    status TEXT,
+                    updated TEXT
+                )
+            """)
+
+    def close(self):
+        self.conn.close()
+
+    def lookup(self, dois):
+        """
+        Returns: a dictionary normalized DOI -> {"source", "path", "status"} for the DOIs present in the index.
+        """
+        dois = list({doi for doi in map(normalize_doi, dois) if doi})
+        found = {}
+        with self._lock:
+            for start in range(0, len(dois), LOOKUP_CHUNK):
+                chunk = dois[start:start + LOOKUP_CHUNK]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT doi, source, path, status FROM dois WHERE doi IN ({placeholders})", chunk).fetchall()
+                for doi, source, path, status in rows:
+                    found[doi] = {"source": source, "path": path, "status": status}
+        return found
+
+    def done_dois(self, dois):
+        """
+        Returns: the set of normalized DOIs whose paper is already downloaded by any source.
+        """
+        return {doi for doi, entry in self.lookup(dois).items() if entry["status"] == "done"}
+
+    def done_keys(self, key_dois):
+        """
+        Lookup for callers keeping their own keys (article url, release_rev_id), the DOIs may be in any format.
+        Returns: the set of keys of the dictionary key -> DOI whose paper is already downloaded by any source.
+        """
+        done_dois = self.done_dois(key_dois.values())
+        return {key for key, doi in key_dois.items() if normalize_doi(doi) in done_dois}
+
+    def record_many(self, entries):
+        # entries: iterable of (doi, source, path, status); a finished paper is never downgraded
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = [(normalize_doi(doi), source, path, status, now) for doi, source, path, status in entries]
+        rows = [row for row in rows if row[0]]
+        if not rows:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT INTO dois (doi, source, path, status, updated) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (doi) DO UPDATE SET source = excluded.source, path = excluded.path,
+                    status = excluded.status, updated = excluded.updated
+                WHERE dois.status != 'done' OR excluded.status = 'done'
+            """, rows)
+
+    def record(self, doi, source, path, status="done"):
+        self.record_many([(doi, source, path, status)])
+
+
+def read_bib_doi(bib_path):
+    try:
+        with open(bib_path, encoding="utf-8", errors="ignore") as bib_file:
+            match = BIB_DOI_PATTERN.search(bib_file.read())
+    except OSError:
+        return None
+    return match.group(1) if match else None
+
+
+def build_index(index, root, source, batch_size=10000):
+    """
+    One-off builder indexing an existing output tree. Works for both layouts:
+    fatcat (<prefix>/<release_rev_id>.pdf + .bib with the DOI inside) and MDPI (<doi with ___>.pdf + .bib).
+    Returns: the number of indexed DOIs.
+    """
+    batch = []
+    count = 0
+    for folder, _, files in os.walk(root):
+        names = set(files)
+        for name in files:
+            stem, extension = os.path.splitext(name)
+            pdf_path = os.path.join(folder, stem + ".pdf")
+
+            if extension == ".bib":
+                doi = read_bib_doi(os.path.join(folder, name))
+                status = "done" if stem + ".pdf" in names else "bib_only"
+            elif extension == ".pdf" and "___" in stem and stem + ".bib" not in names:
+                # MDPI PDF without a bib file, the DOI is in the file name
+                doi = stem
+                status = "done"
+            else:
+                continue
+
+            if normalize_doi(doi):
+                batch.append((doi, source, pdf_path, status))
+            if len(batch) >= batch_size:
+                index.record_many(batch)
+                count += len(batch)
+                batch = []
+
+    index.record_many(batch)
+    return count + len(batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the shared DOI index from existing output trees")
+    parser.add_argument("--db", default=r'S:\doi_index.db', help="Path of the SQLite DOI index")
+    parser.add_argument("--root", required=True, help="Output folder of the scraper")
+    parser.add_argument("--source", required=True, choices=["fatcat", "mdpi"])
+
+    args = parser.parse_args()
+
+    doi_index = DoiIndex(args.db)
+    indexed = build_index(doi_index, args.root, args.source)
+    print(f"Indexed {indexed} DOIs from {args.root} as {args.source}")
+    doi_index.close()
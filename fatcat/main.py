@@ -4,18 +4,60 @@ import pandas as pd
 import requests
 import os
 import sqlite3
-from datetime import datetime
+from datetime import datetime, date, time
 import json
 import subprocess
 import argparse
 
 
-def order_by_release_edit_date(df):
+# Columns added to every paper by the processing functions
+OUTPUT_COLUMNS = ['downloaded', 'status', 'txt_generated', 'month', 'bib_generated', 'processing_date']
+
+
+class PaperRecord:
+    """
+    Lightweight row of a paper, used instead of one-row pandas DataFrames on the per-paper path.
+    The values are stored in a list and the column positions are shared by all records of a query.
+    Values are read and written like pandas rows: record['doi'], record['downloaded'] = "YES".
+    """
+    __slots__ = ('columns', 'values')
+
+    def __init__(self, columns, values):
+        self.columns = columns
+        self.values = list(values)
+        self.values.extend([None] * (len(columns) - len(self.values)))
+
+    def __getitem__(self, name):
+        return self.values[self.columns[name]]
+
+    def __setitem__(self, name, value):
+        self.values[self.columns[name]] = value
+
+    def get(self, name, default=None):
+        index = self.columns.get(name)
+        return default if index is None else self.values[index]
+
+
+def record_columns(column_names):
     """
-    This function orders the rows in a pandas dataframe based on the date in the `release_edit_date` column.
-    Returns: A pandas dataframe with the rows ordered by the date in the `release_edit_date` column.
+    This function maps the column names of a query (plus the output columns) to their position in a PaperRecord.
+    Returns: A dictionary shared by all records of the query.
     """
-    return df.sort_values(by=['release_edit_date'], ascending=True)
+    names = list(column_names) + [column for column in OUTPUT_COLUMNS if column not in column_names]
+    return {name: index for index, name in enumerate(names)}
+
+
+def is_null(value):
+    # Values come from psycopg2 (None), but a NaN or NaT can still come from pandas
+    return value is None or value is pd.NaT or (isinstance(value, float) and value != value)
+
+
+def order_by_release_edit_date(records):
+    """
+    This function orders the records of a paper based on the date in the `release_edit_date` column.
+    Returns: A list with the records ordered by the date in the `release_edit_date` column (missing dates last).
+    """
+    return sorted(records, key=lambda record: (is_null(record['release_edit_date']), record['release_edit_date'] or 0))
 
 
 # Function to create folders based on c_rev_publisher and journal
@@ -33,18 +75,18 @@ def create_folders(output_folder, doi):
     return folder_path
 
 
-# Function to download PDFs from URLs in a DataFrame with retry
-def download_pdfs_with_retry(df, output_folder):
-    max_retries = len(df)
+# Function to download PDFs from the URLs of a paper's records with retry
+def download_pdfs_with_retry(records, output_folder):
+    max_retries = len(records)
     downloaded_rows = []  # Initialize a list to store rows with status
     successfully_downloaded = False  # Flag to track successful download
 
-    for index, row in df.iterrows():
+    for row in records:
         url = row['url']
         doi = row['doi']
 
         # Check if doi is null
-        if pd.isnull(doi):
+        if is_null(doi):
             # Find the next available folder with a unique number
             folder_number = 0
             while True:
@@ -69,7 +111,7 @@ def download_pdfs_with_retry(df, output_folder):
                     file.write(response.content)
                 print("PDF downloaded successfully.")
                 print(f"Downloaded PDF: release_rev_id: {row['release_rev_id']}, title: {row['title']}")
-                # Modify the DataFrame columns based on success
+                # Modify the record columns based on success
                 row['downloaded'] = "YES"
                 row['status'] = str(response.status_code) + ":" + response.reason
 
@@ -92,7 +134,7 @@ def download_pdfs_with_retry(df, output_folder):
 
             else:
                 print(f"Failed to download: {row['release_rev_id']} (Status reason: {response.reason})")
-                # Modify the DataFrame columns based on failure
+                # Modify the record columns based on failure
                 row['downloaded'] = "NO"
                 row['status'] = str(response.status_code) + ":" + response.reason
 
@@ -100,7 +142,7 @@ def download_pdfs_with_retry(df, output_folder):
 
         except Exception as e:
             print(f"Error while downloading PDF: {e}")
-            # Modify the DataFrame columns based on exception
+            # Modify the record columns based on exception
             row['downloaded'] = "NO"
             row['status'] = str(e)
 
@@ -113,102 +155,116 @@ def download_pdfs_with_retry(df, output_folder):
             if not os.path.exists(doi_folder):
                 os.makedirs(doi_folder)
 
-    # Create a DataFrame containing all rows (including failures and errors)
-    downloaded_df = pd.DataFrame(downloaded_rows)
-
     if successfully_downloaded:
         # If at least one PDF was successfully downloaded, return only that row
-        return downloaded_df[downloaded_df['downloaded'] == "YES"].head(1)
+        return [row for row in downloaded_rows if row['downloaded'] == "YES"][:1]
     else:
-        # If no PDFs were successfully downloaded, return all rows
-        return downloaded_df
+        # If no PDFs were successfully downloaded, return all rows (including failures and errors)
+        return downloaded_rows
 
 
-def aggregate_dataframe(df):
+def aggregate_dataframe(records):
     # Check if all rows in the "downloaded" column are "NO"
-    if all(df['downloaded'] == 'NO'):
+    if all(row['downloaded'] == 'NO' for row in records):
         # Take the first row and aggregate URLs and statuses in JSON format
-        urls = df['url'].tolist()
-        statuses = df['status'].tolist()
+        urls = [row['url'] for row in records]
+        statuses = [row['status'] for row in records]
         aggregated_status = json.dumps(dict(zip(urls, statuses)))
         aggregated_urls = ', '.join(urls)
 
         # Update the first row with the aggregated data
-        df.loc[df.index[0], 'url'] = aggregated_urls
-        df.loc[df.index[0], 'status'] = aggregated_status
+        records[0]['url'] = aggregated_urls
+        records[0]['status'] = aggregated_status
 
-        return df.head(1)
+        return records[:1]
     else:
         # Filter rows with "downloaded" equal to "YES"
-        yes_rows = df[df['downloaded'] == 'YES']
-        if not yes_rows.empty:
-            return yes_rows.head(1)
+        yes_rows = [row for row in records if row['downloaded'] == 'YES']
+        if yes_rows:
+            return yes_rows[:1]
         else:
-            # If there are no rows with "YES," return the entire DataFrame
-            return df
+            # If there are no rows with "YES," return all records
+            return records
 
 
-def add_month_column(df):
-    # Convert release_date to datetime format
-    df['release_date'] = pd.to_datetime(df['release_date'], errors='coerce')
+def to_datetime(value):
+    # Same result as pd.to_datetime(errors='coerce') for the values of a single record
+    if is_null(value):
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time())
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def add_month_column(records):
+    for row in records:
+        # Convert release_date to datetime format
+        row['release_date'] = to_datetime(row['release_date'])
 
-    # Extract month and create a new column 'month'
-    df['month'] = df['release_date'].apply(lambda x: datetime.strftime(x, "%B") if not pd.isna(x) else '')
+        # Extract month and store it in the 'month' column
+        row['month'] = datetime.strftime(row['release_date'], "%B") if row['release_date'] is not None else ''
 
-    return df
+    return records
 
 
 
-def generate_bibtex_entries(df, output_folder):
+def generate_bibtex_entries(records, output_folder):
     try:
         bib_entries = []
 
-        for index, row in df.iterrows():
+        for row in records:
             pdf_url = row['url']
             doi = row['doi']
             file_name = f"{row['release_rev_id']}"
 
             # Check if 'doi' and 'title' are both NULL
-            if (pd.isna(row['doi']) and pd.isna(row['title'])) or (isinstance(row['url'], str) and ',' in row['url']):
-                df.at[index, 'bib_generated'] = 'NO'
+            if (is_null(row['doi']) and is_null(row['title'])) or (isinstance(row['url'], str) and ',' in row['url']):
+                row['bib_generated'] = 'NO'
                 continue
 
             bib_entry = f"@article{{{file_name},\n"
 
             # Check and replace NULL values for various entries
-            bib_entry += f"  doi = {{{row['doi'] if pd.notna(row['doi']) else ''}}},\n"
+            bib_entry += f"  doi = {{{row['doi'] if not is_null(row['doi']) else ''}}},\n"
             bib_entry += f"  url = {{{row['url']}}},\n"
-            bib_entry += f"  month = {{{row['month'] if pd.notna(row['month']) else ''}}},\n"
-            bib_entry += f"  year = {{{row['release_year'] if pd.notna(row['release_year']) else ''}}},\n"
-            bib_entry += f"  publisher = {{{row['c_rev_publisher'] if pd.notna(row['c_rev_publisher']) else ''}}},\n"
-            bib_entry += f"  volume = {{{row['volume'] if pd.notna(row['volume']) else ''}}},\n"
-            bib_entry += f"  number = {{{row['number'] if pd.notna(row['number']) else ''}}},\n"
-            bib_entry += f"  pages = {{{row['pages'] if pd.notna(row['pages']) else ''}}},\n"
+            bib_entry += f"  month = {{{row['month'] if not is_null(row['month']) else ''}}},\n"
+            bib_entry += f"  year = {{{row['release_year'] if not is_null(row['release_year']) else ''}}},\n"
+            bib_entry += f"  publisher = {{{row['c_rev_publisher'] if not is_null(row['c_rev_publisher']) else ''}}},\n"
+            bib_entry += f"  volume = {{{row['volume'] if not is_null(row['volume']) else ''}}},\n"
+            bib_entry += f"  number = {{{row['number'] if not is_null(row['number']) else ''}}},\n"
+            bib_entry += f"  pages = {{{row['pages'] if not is_null(row['pages']) else ''}}},\n"
 
             # Check if 'authors' is not null
-            if pd.notna(row['authors']):
+            if not is_null(row['authors']):
                 bib_entry += f"  author = {{{row['authors']}}},\n"
-            elif pd.notna(row['editors']):
+            elif not is_null(row['editors']):
                 # If 'authors' is null and 'editors' is not null, add 'editor' entry
                 bib_entry += f"  editor = {{{row['editors']}}},\n"
             else:
                 # If both 'authors' and 'editors' are null, add 'author' with an empty string
                 bib_entry += f"  author = {{}},\n"
 
-            bib_entry += f"  title = {{{row['title'] if pd.notna(row['title']) else ''}}},\n"
-            bib_entry += f"  journal = {{{row['journal'] if pd.notna(row['journal']) else ''}}},\n"
+            bib_entry += f"  title = {{{row['title'] if not is_null(row['title']) else ''}}},\n"
+            bib_entry += f"  journal = {{{row['journal'] if not is_null(row['journal']) else ''}}},\n"
             bib_entry += "}\n"
             bib_entries.append(bib_entry)
 
             # Mark that a Bib-file was successfully generated
-            df.at[index, 'bib_generated'] = 'YES'
+            row['bib_generated'] = 'YES'
 
         if bib_entries:
             # Combine all BibTeX entries into a single string
             bibtex_string = '\n'.join(bib_entries)
 
             # Check if 'doi' is null and use the same folder as the PDF
-            if pd.isna(doi):
+            if is_null(doi):
                 folder_number = 0
                 while True:
                     doi_folder = os.path.join(output_folder, f"10.xxxx{folder_number}")
@@ -233,34 +289,81 @@ def generate_bibtex_entries(df, output_folder):
     except Exception as e:
         print(f"Error: {e}")
         # Mark that a Bib-file could not be generated due to an error
-        df.at[index, 'bib_generated'] = 'NO'
+        row['bib_generated'] = 'NO'
 
-    return df
+    return records
 
 
-def processing_date(df):
+def processing_date(records):
     # Get the current timestamp
     processing_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    # Add the processing_date to the DataFrame
-    df['processing_date'] = processing_date
+    # Add the processing_date to the records
+    for row in records:
+        row['processing_date'] = processing_date
+
+    return records
+
 
-    return df
+# Folder where the PDFs and bib files are stored
+papers_output_folder = r'S:\Fatcat_papers'
 
 
 # Define the main function
-def process_and_store_data(df):
+def process_and_store_data(records):
     try:
-        # Run functions on the input DataFrame
-        df = order_by_release_edit_date(df=df)
-        df = download_pdfs_with_retry(df=df, output_folder=r'S:\Fatcat_papers')
-        df = aggregate_dataframe(df=df)
-        df = add_month_column(df=df)
-        df = generate_bibtex_entries(df=df, output_folder=r'S:\Fatcat_papers')
-        df = processing_date(df=df)
+        # Run functions on the records of one paper
+        records = order_by_release_edit_date(records=records)
+        records = download_pdfs_with_retry(records=records, output_folder=papers_output_folder)
+        records = aggregate_dataframe(records=records)
+        records = add_month_column(records=records)
+        records = generate_bibtex_entries(records=records, output_folder=papers_output_folder)
+        records = processing_date(records=records)
 
     except Exception as e:
         print(f"Error processing and storing data: {e}")
-    return df
+    return records
+
+
+def store_records(conn_sqlite, table_name, records):
+    """
+    This function inserts a batch of processed records into the SQLite table with a single pandas call.
+    Columns missing in an existing table (e.g. `txt_generated`) are added first.
+    """
+    if not records:
+        return
+    columns = list(records[0].columns)
+    existing_columns = {row[1] for row in conn_sqlite.execute(f"PRAGMA table_info({table_name})")}
+    if existing_columns:
+        for column in columns:
+            if column not in existing_columns:
+                conn_sqlite.execute(f'ALTER TABLE {table_name} ADD COLUMN "{column}"')
+    df = pd.DataFrame([row.values for row in records], columns=columns)
+    df.to_sql(name=table_name, con=conn_sqlite, if_exists='append', index=False)
+
+
+def paper_doi(records):
+    # The DOI of a paper is the first non-null DOI of its records
+    for row in records:
+        if not is_null(row['doi']):
+            return row['doi']
+    return None
+
+
+def doi_index_entries(records):
+    """
+    This function converts processed records into entries of the shared DOI index.
+    Returns: A list of (doi, source, path, status) tuples.
+    """
+    entries = []
+    for row in records:
+        if is_null(row['doi']):
+            continue
+        if row['downloaded'] == "YES":
+            path = os.path.join(papers_output_folder, row['doi'].split('/')[0], f"{row['release_rev_id']}.pdf")
+            entries.append((row['doi'], "fatcat", path, "done"))
+        else:
+            entries.append((row['doi'], "fatcat", None, "failed"))
+    return entries
 
 
 # Specify the full path to the text file
@@ -268,7 +371,7 @@ full_path_to_file = r'S:\processed_release_rev_ids.txt'
 
 
 def connect_to_postgres(user, password, host, port, database, table_name, processed_tbl_name, sqlite_db_path, filter,
-                        filter_values):
+                        filter_values, batch_size=100, doi_index=None):
     try:
         # Connect to the PostgreSQL database
         conn = psycopg2.connect(user=user, password=password, host=host, port=port, database=database)
@@ -315,12 +418,19 @@ def connect_to_postgres(user, password, host, port, database, table_name, proces
         # Get column names
         column_names = [desc[0] for desc in cursor.description]
 
-        # Create a Pandas DataFrame from the fetched rows
-        table_data = pd.DataFrame(rows, columns=column_names)
-        # print(table_data.head(5))
+        # Group the fetched rows into records per release_rev_id (in order of first appearance)
+        columns = record_columns(column_names)
+        rev_id_index = columns['release_rev_id']
+        records_by_rev_id = {}
+        for row in rows:
+            records_by_rev_id.setdefault(row[rev_id_index], []).append(PaperRecord(columns, row))
 
-        # Get a list of distinct release_rev_id values
-        release_rev_id_values = table_data['release_rev_id'].unique()
+        # Look up all DOIs in the shared DOI index at once, papers downloaded by any source are skipped
+        indexed_rev_ids = set()
+        if doi_index is not None:
+            indexed_rev_ids = doi_index.done_keys(
+                {release_rev_id: paper_doi(records) for release_rev_id, records in records_by_rev_id.items()})
+            print(f"{len(indexed_rev_ids)} papers are already downloaded according to the DOI index")
 
         # Load processed release_rev_id values from the text file
         processed_rev_ids = set()
@@ -331,34 +441,55 @@ def connect_to_postgres(user, password, host, port, database, table_name, proces
         # Initialize a counter for the total number of processed papers
         processed_papers_count = 0
 
-        # Loop through distinct release_rev_id values
-        for release_rev_id in release_rev_id_values:
-            print("-" * 80)
-
-            # Check if release_rev_id is already in the processed set
-            if release_rev_id in processed_rev_ids:
-                print(f"Skipping release_rev_id {release_rev_id} as it is already processed and in the text file.")
-                continue
-
-            processed_papers_count += 1
-            # Perform some processing for each iteration
-            print(f"Iteration {processed_papers_count}: Processing release_rev_id: {release_rev_id}")
-
-            # Filter data for the current release_rev_id
-            current_data = table_data[table_data['release_rev_id'] == release_rev_id]
-
-            # Process the data for the current release_rev_id
-            df = process_and_store_data(df=current_data)
-            print("Processed release_rev_id: ", release_rev_id)
+        # Processed papers are inserted into SQLite in batches
+        pending_records = []
+        pending_rev_ids = []
 
+        def flush_pending():
             # Insert the processed data into the "processed_papers" table in SQLite
-            df.to_sql(name=processed_tbl_name, con=conn_sqlite, if_exists='append', index=False)
+            store_records(conn_sqlite, processed_tbl_name, pending_records)
+            if doi_index is not None:
+                doi_index.record_many(doi_index_entries(pending_records))
 
-            # Add the processed release_rev_id to the set and write it to the text file
-            processed_rev_ids.add(release_rev_id)
+            # Add the processed release_rev_ids to the set and write them to the text file
+            processed_rev_ids.update(pending_rev_ids)
             with open(full_path_to_file, "a") as file:
-                file.write(release_rev_id + "\n")
+                for processed_rev_id in pending_rev_ids:
+                    file.write(processed_rev_id + "\n")
 
+            pending_records.clear()
+            pending_rev_ids.clear()
+
+        # The papers processed since the last batch are stored even if the loop is interrupted (error or Ctrl-C)
+        try:
+            # Loop through distinct release_rev_id values
+            for release_rev_id, current_records in records_by_rev_id.items():
+                print("-" * 80)
+
+                # Check if release_rev_id is already in the processed set
+                if release_rev_id in processed_rev_ids:
+                    print(f"Skipping release_rev_id {release_rev_id} as it is already processed and in the text file.")
+                    continue
+
+                # Check if the paper was already downloaded (by fatcat or MDPI) according to the DOI index
+                if release_rev_id in indexed_rev_ids:
+                    print(f"Skipping release_rev_id {release_rev_id} as its DOI is already downloaded according to the DOI index.")
+                    continue
+
+                processed_papers_count += 1
+                # Perform some processing for each iteration
+                print(f"Iteration {processed_papers_count}: Processing release_rev_id: {release_rev_id}")
+
+                # Process the records of the current release_rev_id
+                processed_records = process_and_store_data(records=current_records)
+                print("Processed release_rev_id: ", release_rev_id)
+
+                pending_records.extend(processed_records)
+                pending_rev_ids.append(release_rev_id)
+                if len(pending_rev_ids) >= batch_size:
+                    flush_pending()
+        finally:
+            flush_pending()
 
         # Print the final number of iterations
         print(f"Total number of iterations: {processed_papers_count}")
@@ -379,8 +510,17 @@ if __name__ == "__main__":
 
     parser.add_argument("--filter_values", required=True, help="Filter values")
 
+    parser.add_argument("--doi_index",
+                        help=r"Path of the DOI index shared with the MDPI scraper, e.g. S:\doi_index.db (optional)")
+
     args = parser.parse_args()
 
+    doi_index = None
+    if args.doi_index:
+        # doi_index.py lives in the repository root, which has to be on PYTHONPATH
+        from doi_index import DoiIndex
+        doi_index = DoiIndex(args.doi_index)
+
     connect_to_postgres(
         database="fatcat",
         user="postgres",
@@ -390,7 +530,11 @@ if __name__ == "__main__":
         table_name="fatcat_bmt",
         processed_tbl_name="fatcat_processed_papers",
         sqlite_db_path="F:\\fatcat.db",
+        doi_index=doi_index,
         filter="rev_publisher",
         filter_values=args.filter_values
     )
 
+    if doi_index is not None:
+        doi_index.close()
+
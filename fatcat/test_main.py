@@ -0,0 +1,171 @@
+import json
+import os
+import sqlite3
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+import main
+
+
+COLUMNS = ['release_rev_id', 'doi', 'url', 'release_year', 'release_date', 'c_rev_publisher', 'rev_publisher',
+           'journal', 'volume', 'number', 'pages', 'authors', 'editors', 'title', 'release_edit_date']
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.reason = "OK" if status_code == 200 else "Not Found"
+        self.content = b"%PDF-1.4"
+
+
+class FakeProcess:
+    returncode = 0
+
+
+@pytest.fixture
+def output_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "papers_output_folder", str(tmp_path))
+    monkeypatch.setattr(main.subprocess, "run", lambda *args, **kwargs: FakeProcess())
+    return tmp_path
+
+
+def serve(monkeypatch, status_by_url):
+    monkeypatch.setattr(main.requests, "get", lambda url: FakeResponse(status_by_url[url]))
+
+
+def make_records(rows):
+    columns = main.record_columns(COLUMNS)
+    return [main.PaperRecord(columns, [row.get(column) for column in COLUMNS]) for row in rows]
+
+
+def paper_row(**values):
+    row = {'release_rev_id': "rev-1", 'doi': "10.3390/test1", 'release_year': 2020, 'release_date': date(2020, 3, 5),
+           'c_rev_publisher': "MDPI", 'journal': "Sensors", 'volume': "20", 'number': "5", 'pages': "1-10",
+           'authors': "Doe, Jane", 'title': "A paper"}
+    row.update(values)
+    return row
+
+
+def test_process_and_store_data_success(output_folder, monkeypatch):
+    serve(monkeypatch, {"https://a.test/1.pdf": 404, "https://b.test/1.pdf": 200})
+    records = make_records([
+        paper_row(url="https://a.test/1.pdf", release_edit_date=datetime(2021, 1, 1)),
+        paper_row(url="https://b.test/1.pdf", release_edit_date=datetime(2022, 1, 1)),
+    ])
+
+    processed = main.process_and_store_data(records)
+
+    assert len(processed) == 1
+    row = processed[0]
+    assert row['url'] == "https://b.test/1.pdf"
+    assert row['downloaded'] == "YES"
+    assert row['status'] == "200:OK"
+    assert row['txt_generated'] == "YES"
+    assert row['release_date'] == datetime(2020, 3, 5)
+    assert row['month'] == "March"
+    assert row['bib_generated'] == "YES"
+    assert row['processing_date'] is not None
+    assert os.path.exists(output_folder / "10.3390" / "rev-1.pdf")
+    assert "doi = {10.3390/test1}" in (output_folder / "10.3390" / "rev-1.bib").read_text(encoding="utf-8")
+
+
+def test_process_and_store_data_all_failed(output_folder, monkeypatch):
+    serve(monkeypatch, {"https://a.test/1.pdf": 404, "https://b.test/1.pdf": 404})
+    records = make_records([
+        paper_row(url="https://a.test/1.pdf", release_edit_date=datetime(2021, 1, 1)),
+        paper_row(url="https://b.test/1.pdf", release_edit_date=datetime(2022, 1, 1)),
+    ])
+
+    processed = main.process_and_store_data(records)
+
+    # The failed records are merged into the first one
+    assert len(processed) == 1
+    row = processed[0]
+    assert row['downloaded'] == "NO"
+    assert row['url'] == "https://a.test/1.pdf, https://b.test/1.pdf"
+    assert json.loads(row['status']) == {"https://a.test/1.pdf": "404:Not Found",
+                                         "https://b.test/1.pdf": "404:Not Found"}
+    assert row['month'] == "March"
+    assert row['bib_generated'] == "NO"
+    assert not os.path.exists(output_folder / "10.3390" / "rev-1.bib")
+
+
+def test_process_and_store_data_null_doi_and_date(output_folder, monkeypatch):
+    serve(monkeypatch, {"https://a.test/2.pdf": 200})
+    records = make_records([paper_row(release_rev_id="rev-2", doi=None, url="https://a.test/2.pdf",
+                                      release_date=pd.NaT, release_edit_date=None)])
+
+    processed = main.process_and_store_data(records)
+
+    assert len(processed) == 1
+    row = processed[0]
+    assert row['downloaded'] == "YES"
+    assert row['release_date'] is None
+    assert row['month'] == ''
+    assert row['bib_generated'] == "YES"
+    assert row['processing_date'] is not None
+    # Papers without DOI are stored in the numbered 10.xxxx folders
+    assert os.path.exists(output_folder / "10.xxxx0" / "rev-2.pdf")
+    assert list(output_folder.glob("10.xxxx*/rev-2.bib"))
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.description = [(column,) for column in COLUMNS]
+
+    def execute(self, query):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_connect_to_postgres_stores_pending_papers_when_interrupted(output_folder, monkeypatch):
+    rows = [tuple(paper_row(release_rev_id=f"rev-{i}", doi=f"10.3390/test{i}", url=f"https://a.test/{i}.pdf")
+                  .get(column) for column in COLUMNS) for i in range(3)]
+    monkeypatch.setattr(main.psycopg2, "connect", lambda **kwargs: FakeConnection(rows))
+    processed_file = output_folder / "processed_release_rev_ids.txt"
+    processed_file.write_text("")
+    monkeypatch.setattr(main, "full_path_to_file", str(processed_file))
+
+    # Ctrl-C while the third paper is processed
+    process = main.process_and_store_data
+
+    def interrupted(records):
+        if records[0]['release_rev_id'] == "rev-2":
+            raise KeyboardInterrupt
+        return process(records)
+
+    monkeypatch.setattr(main, "process_and_store_data", interrupted)
+    serve(monkeypatch, {f"https://a.test/{i}.pdf": 200 for i in range(3)})
+    sqlite_path = output_folder / "papers.db"
+
+    with pytest.raises(KeyboardInterrupt):
+        main.connect_to_postgres("user", "password", "host", 5432, "fatcat", "releases", "processed_papers",
+                                 str(sqlite_path), "c_rev_publisher", "MDPI", batch_size=100)
+
+    # The two papers processed before the interruption are stored although the batch was not full
+    with sqlite3.connect(sqlite_path) as conn:
+        stored = [row[0] for row in conn.execute("SELECT release_rev_id FROM processed_papers ORDER BY release_rev_id")]
+    assert stored == ["rev-0", "rev-1"]
+    assert processed_file.read_text().split() == ["rev-0", "rev-1"]
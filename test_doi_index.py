@@ -0,0 +1,80 @@
+import os
+
+from doi_index import DoiIndex, build_index, normalize_doi
+
+
+def test_normalize_doi():
+    assert normalize_doi("10.3390/S20051234") == "10.3390/s20051234"
+    assert normalize_doi("https://doi.org/10.3390/s20051234") == "10.3390/s20051234"
+    assert normalize_doi("http://dx.doi.org/10.3390/s20051234 ") == "10.3390/s20051234"
+    assert normalize_doi("doi:10.1000/xyz") == "10.1000/xyz"
+    # MDPI file names use "___" instead of "/"
+    assert normalize_doi("10.3390___s20051234") == "10.3390/s20051234"
+
+
+def test_normalize_doi_rejects_placeholders():
+    assert normalize_doi(None) is None
+    assert normalize_doi("") is None
+    assert normalize_doi("Not found") is None
+    assert normalize_doi("No_DOI") is None
+    assert normalize_doi(float("nan")) is None
+
+
+def test_done_is_never_downgraded(tmp_path):
+    index = DoiIndex(str(tmp_path / "index.db"))
+    index.record("10.1/A", "mdpi", "a.pdf")
+    index.record_many([("https://doi.org/10.1/a", "fatcat", None, "failed"), ("10.1/b", "fatcat", None, "failed")])
+    index.record("10.1/b", "fatcat", "b.pdf")
+
+    assert index.lookup(["10.1/a", "10.1/b", "10.1/c"]) == {
+        "10.1/a": {"source": "mdpi", "path": "a.pdf", "status": "done"},
+        "10.1/b": {"source": "fatcat", "path": "b.pdf", "status": "done"},
+    }
+    index.close()
+
+
+def test_done_keys(tmp_path):
+    index = DoiIndex(str(tmp_path / "index.db"))
+    index.record("10.1/a", "mdpi", "a.pdf")
+    index.record("10.1/b", "fatcat", None, status="failed")
+
+    keys = index.done_keys({"u1": "https://doi.org/10.1/A", "u2": "10.1/b", "u3": None, "u4": "10.1/c"})
+
+    assert keys == {"u1"}
+    index.close()
+
+
+def write(path, content=""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as output_file:
+        output_file.write(content)
+
+
+def test_build_index_fatcat_layout(tmp_path):
+    root = tmp_path / "fatcat"
+    write(str(root / "10.1000" / "rev-1.pdf"))
+    write(str(root / "10.1000" / "rev-1.bib"), "@article{rev-1,\n  doi = {10.1000/ABC},\n}\n")
+    write(str(root / "10.1000" / "rev-2.bib"), "@article{rev-2,\n  doi = {10.1000/def},\n}\n")
+    write(str(root / "10.xxxx0" / "rev-3.bib"), "@article{rev-3,\n  doi = {},\n}\n")
+    index = DoiIndex(str(tmp_path / "index.db"))
+
+    assert build_index(index, str(root), "fatcat") == 2
+    assert index.lookup(["10.1000/abc", "10.1000/def"]) == {
+        "10.1000/abc": {"source": "fatcat", "path": str(root / "10.1000" / "rev-1.pdf"), "status": "done"},
+        "10.1000/def": {"source": "fatcat", "path": str(root / "10.1000" / "rev-2.pdf"), "status": "bib_only"},
+    }
+    index.close()
+
+
+def test_build_index_mdpi_layout(tmp_path):
+    root = tmp_path / "mdpi"
+    write(str(root / "10.3390___s1.pdf"))
+    write(str(root / "10.3390___s1.bib"), "@article{10.3390___s1,\n  doi = {10.3390/s1},\n}\n")
+    # PDF without bib file, the DOI comes from the file name
+    write(str(root / "10.3390___s2.pdf"))
+    write(str(root / "unknown_pdf_j_9_1.pdf"))
+    index = DoiIndex(str(tmp_path / "index.db"))
+
+    assert build_index(index, str(root), "mdpi") == 2
+    assert index.done_dois(["10.3390/s1", "10.3390/s2"]) == {"10.3390/s1", "10.3390/s2"}
+    index.close()
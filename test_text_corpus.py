@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from text_corpus import CorpusReader, CorpusWriter, INDEX_RECORD, index_path, pack_tree, shard_path
+
+
+def test_round_trip_with_shard_rollover(tmp_path):
+    corpus = str(tmp_path / "corpus" / "papers")
+    papers = {f"paper-{i}": (f"text {i} ".encode() * 5, f"@article{{paper-{i}}}".encode()) for i in range(5)}
+
+    with CorpusWriter(corpus, max_shard_bytes=100) as writer:
+        for paper_id, (text, bib) in papers.items():
+            writer.append(paper_id, text, bib)
+
+    # Every paper is bigger than half a shard, so each one starts a new shard
+    assert os.path.exists(shard_path(corpus, 4))
+    assert not os.path.exists(shard_path(corpus, 5))
+
+    with CorpusReader(corpus) as reader:
+        assert len(reader) == 5
+        assert "paper-3" in reader
+        for paper_id, (text, bib) in papers.items():
+            with reader.text(paper_id) as text_view, reader.bib(paper_id) as bib_view:
+                assert bytes(text_view) == text
+                assert bytes(bib_view) == bib
+        # Iteration is in file order
+        assert [paper_id for paper_id, _, _ in reader] == list(papers)
+
+
+def test_reopened_writer_appends_and_replaces(tmp_path):
+    corpus = str(tmp_path / "papers")
+    with CorpusWriter(corpus) as writer:
+        writer.append("a", b"", b"@article{a}")
+        writer.append("b", b"text b", b"@article{b}")
+
+    # The text of "a" was extracted later, the new entry replaces the old one
+    with CorpusWriter(corpus) as writer:
+        assert set(writer.entries) == {"a", "b"}
+        writer.append("a", b"text a", b"@article{a}")
+
+    with CorpusReader(corpus) as reader:
+        assert len(reader) == 2
+        with reader.text("a") as text_view:
+            assert bytes(text_view) == b"text a"
+
+
+def test_truncated_index_record_is_dropped(tmp_path):
+    corpus = str(tmp_path / "papers")
+    with CorpusWriter(corpus) as writer:
+        writer.append("a", b"text a", b"")
+    # An append interrupted in the middle of the index record
+    with open(index_path(corpus), "ab") as index_file:
+        index_file.write(b"\0" * (INDEX_RECORD.size // 2))
+
+    with CorpusReader(corpus) as reader:
+        assert list(reader.entries) == ["a"]
+
+    with CorpusWriter(corpus) as writer:
+        writer.append("b", b"text b", b"")
+    assert os.path.getsize(index_path(corpus)) == 2 * INDEX_RECORD.size
+    with CorpusReader(corpus) as reader:
+        with reader.text("b") as text_view:
+            assert bytes(text_view) == b"text b"
+
+
+def test_paper_id_too_long(tmp_path):
+    with CorpusWriter(str(tmp_path / "papers")) as writer:
+        with pytest.raises(ValueError):
+            writer.append("x" * 65, b"", b"")
+
+
+def test_pack_tree_is_incremental(tmp_path):
+    root = tmp_path / "out" / "10.1000"
+    root.mkdir(parents=True)
+    (root / "rev-1.bib").write_bytes(b"@article{rev-1}")
+    (root / "rev-1.pdf").write_bytes(b"%PDF")
+    (root / "rev-2.txt").write_bytes(b"text 2")
+    (root / "rev-2.bib").write_bytes(b"@article{rev-2}")
+    corpus = str(tmp_path / "papers")
+
+    with CorpusWriter(corpus) as writer:
+        assert pack_tree(writer, str(tmp_path / "out")) == 2
+        assert pack_tree(writer, str(tmp_path / "out")) == 0
+
+        # pdftotext ran for rev-1 in the meantime
+        (root / "rev-1.txt").write_bytes(b"text 1")
+        assert pack_tree(writer, str(tmp_path / "out")) == 1
+
+    with CorpusReader(corpus) as reader:
+        with reader.text("rev-1") as text_view, reader.bib("rev-2") as bib_view:
+            assert bytes(text_view) == b"text 1"
+            assert bytes(bib_view) == b"@article{rev-2}"
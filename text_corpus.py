@@ -0,0 +1,210 @@
+import argparse
+import mmap
+import os
+import struct
+
+# Fixed-width index record: paper id, shard number, text offset/length, bib offset/length
+ID_SIZE = 64
+INDEX_RECORD = struct.Struct(f"<{ID_SIZE}sHQIQI")
+# A new data shard is started once the current one reaches this size
+MAX_SHARD_BYTES = 4 * 1024 ** 3
+
+
+def shard_path(corpus_path, shard):
+    return f"{corpus_path}-{shard:05d}.dat"
+
+
+def index_path(corpus_path):
+    return f"{corpus_path}.idx"
+
+
+def encode_id(paper_id):
+    encoded = paper_id.encode("utf-8")
+    if len(encoded) > ID_SIZE:
+        raise ValueError(f"Paper id longer than {ID_SIZE} bytes: {paper_id}")
+    return encoded
+
+
+def read_index(corpus_path):
+    """
+    Reads the index of a corpus. A paper appended again (e.g. once its text was extracted) replaces the older entry.
+    Returns: a dictionary paper id -> (shard, text offset, text length, bib offset, bib length).
+    """
+    entries = {}
+    path = index_path(corpus_path)
+    if not os.path.exists(path) or os.path.getsize(path) < INDEX_RECORD.size:
+        return entries
+    with open(path, "rb") as index_file, mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index_map:
+        # A record cut by an interrupted append is ignored
+        usable = len(index_map) - len(index_map) % INDEX_RECORD.size
+        for paper_id, *location in INDEX_RECORD.iter_unpack(index_map[:usable]):
+            entries[paper_id.rstrip(b"\0").decode("utf-8")] = tuple(location)
+    return entries
+
+
+class CorpusWriter:
+    """
+    Appends papers (extracted text + bib metadata) to a corpus made of large data shards and one index
+    of fixed-width records. Existing files are never rewritten, new papers are only appended.
+    """
+
+    def __init__(self, corpus_path, max_shard_bytes=MAX_SHARD_BYTES):
+        self.corpus_path = corpus_path
+        self.max_shard_bytes = max_shard_bytes
+        self.entries = read_index(corpus_path)
+
+        folder = os.path.dirname(corpus_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        # Drop a record cut by an interrupted append, so that the next records stay aligned
+        path = index_path(corpus_path)
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            if size % INDEX_RECORD.size:
+                with open(path, "r+b") as index_file:
+                    index_file.truncate(size - size % INDEX_RECORD.size)
+
+        self.shard = 0
+        while os.path.exists(shard_path(corpus_path, self.shard + 1)):
+            self.shard += 1
+        self.data_file = open(shard_path(corpus_path, self.shard), "ab")
+        self.index_file = open(path, "ab")
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, paper_id, text, bib):
+        encoded_id = encode_id(paper_id)
+        if self.data_file.tell() + len(text) + len(bib) > self.max_shard_bytes and self.data_file.tell() > 0:
+            self.data_file.close()
+            self.shard += 1
+            self.data_file = open(shard_path(self.corpus_path, self.shard), "ab")
+
+        text_offset = self.data_file.tell()
+        self.data_file.write(text)
+        bib_offset = self.data_file.tell()
+        self.data_file.write(bib)
+        # The data is written before the index record, so a record never points at missing data
+        self.data_file.flush()
+
+        location = (self.shard, text_offset, len(text), bib_offset, len(bib))
+        self.index_file.write(INDEX_RECORD.pack(encoded_id, *location))
+        self.entries[paper_id] = location
+
+    def flush(self):
+        self.data_file.flush()
+        self.index_file.flush()
+
+
+class CorpusReader:
+    """
+    Memory-maps the data shards of a corpus. text() and bib() return zero-copy memoryviews, iterating
+    yields the papers in file order, so a full pass is sequential I/O.
+    The returned views must be released before the reader is closed.
+    """
+
+    def __init__(self, corpus_path):
+        self.corpus_path = corpus_path
+        self.entries = read_index(corpus_path)
+        self._files = []
+        self._maps = []
+        shard = 0
+        while os.path.exists(shard_path(corpus_path, shard)):
+            data_file = open(shard_path(corpus_path, shard), "rb")
+            self._files.append(data_file)
+            # An empty file can't be memory-mapped
+            empty = os.path.getsize(data_file.name) == 0
+            self._maps.append(b"" if empty else mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ))
+            shard += 1
+        self._views = [memoryview(shard_map) for shard_map in self._maps]
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        for shard_map in self._maps:
+            if isinstance(shard_map, mmap.mmap):
+                shard_map.close()
+        for data_file in self._files:
+            data_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, paper_id):
+        return paper_id in self.entries
+
+    def text(self, paper_id):
+        shard, text_offset, text_length, _, _ = self.entries[paper_id]
+        return self._views[shard][text_offset:text_offset + text_length]
+
+    def bib(self, paper_id):
+        shard, _, _, bib_offset, bib_length = self.entries[paper_id]
+        return self._views[shard][bib_offset:bib_offset + bib_length]
+
+    def __iter__(self):
+        for paper_id, (shard, text_offset, text_length, bib_offset, bib_length) in sorted(
+                self.entries.items(), key=lambda entry: (entry[1][0], entry[1][1])):
+            view = self._views[shard]
+            yield paper_id, view[text_offset:text_offset + text_length], view[bib_offset:bib_offset + bib_length]
+
+
+def read_file(path):
+    with open(path, "rb") as source_file:
+        return source_file.read()
+
+
+def pack_tree(writer, root):
+    """
+    Incrementally packs an output tree: every <id>.txt from pdftotext (fatcat) and every <id>.bib
+    (fatcat and MDPI) is stored under the paper id <id>. Papers already in the corpus are skipped,
+    a paper stored without text is appended again once its text exists.
+    Returns: the number of appended papers.
+    """
+    appended = 0
+    for folder, _, files in os.walk(root):
+        # The directory listing is enough to know which files exist, no extra stat per paper
+        names = set(files)
+        stems = {os.path.splitext(name)[0] for name in files if name.endswith((".txt", ".bib"))}
+        for stem in sorted(stems):
+            has_text = stem + ".txt" in names
+            entry = writer.entries.get(stem)
+            if entry is not None and (entry[2] > 0 or not has_text):
+                continue
+
+            text = read_file(os.path.join(folder, stem + ".txt")) if has_text else b""
+            bib = read_file(os.path.join(folder, stem + ".bib")) if stem + ".bib" in names else b""
+            try:
+                writer.append(stem, text, bib)
+            except ValueError as e:
+                print(f"Error: {e}")
+                continue
+            appended += 1
+    writer.flush()
+    return appended
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack extracted texts and bib files into a memory-mappable corpus")
+    parser.add_argument("--corpus", default=r'S:\corpus\papers', help="Path prefix of the corpus files")
+    parser.add_argument("--root", action="append", required=True, help="Output folder of a scraper (repeatable)")
+
+    args = parser.parse_args()
+
+    with CorpusWriter(args.corpus) as corpus_writer:
+        for tree in args.root:
+            print(f"Packed {pack_tree(corpus_writer, tree)} papers from {tree}")
+        print(f"Corpus {args.corpus} contains {len(corpus_writer.entries)} papers")